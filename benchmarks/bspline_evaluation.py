@@ -0,0 +1,98 @@
+'''Compare the per window forward differences loop with the adaptive
+flattening that tessellates B-Spline curves for rendering
+
+Run from the repository root with:
+    python -m benchmarks.bspline_evaluation [number_of_control_points]
+'''
+import sys
+import time
+from random import Random
+from typing import Callable, List
+
+import numpy as np
+
+from src.model.objects import Vertex, BSplineCurve, flatten_bezier_segments
+
+
+STEP = 0.01
+
+# Flatness tolerance, in world units
+TOLERANCE = 0.5
+
+MBS = np.array([[-1, 3, -3, 1],
+                [3, -6, 3, 0],
+                [-3, 0, 3, 0],
+                [1, 4, 1, 0]]) / 6
+
+
+def create_curve(size: int) -> BSplineCurve:
+    '''Create a spline with size random control points'''
+    rnd = Random(0)
+    return BSplineCurve('spline', [
+        Vertex(rnd.uniform(-300, 300), rnd.uniform(-300, 300),
+               rnd.uniform(-300, 300))
+        for _ in range(size)
+    ])
+
+
+def with_forward_differences(curve: BSplineCurve) -> np.ndarray:
+    '''Evaluate the curve the way it used to be, one window at a time with
+    forward differences accumulated in a Python loop'''
+    E = np.array([[0, 0, 0, 1],
+                  [STEP**3, STEP**2, STEP, 0],
+                  [6*STEP**3, 2*STEP**2, 0, 0],
+                  [6*STEP**3, 0, 0, 0]])
+    steps = int(1/STEP)
+
+    polylines = []
+    for window in curve.windows():
+        point, d1, d2, d3 = E.dot(MBS.dot(window))
+        points = [point]
+        for _ in range(steps):
+            point = point + d1
+            points.append(point)
+            d1 = d1 + d2
+            d2 = d2 + d3
+        polylines.append(points)
+
+    return np.array(polylines)
+
+
+def with_flattening(curve: BSplineCurve) -> List[np.ndarray]:
+    '''Subdivide every window at once, as its Bezier control points, until
+    it is within tolerance of its polylines'''
+    return flatten_bezier_segments(curve.bezier_segments(), TOLERANCE)
+
+
+def measure(evaluate: Callable, curve: BSplineCurve, repeat: int = 3
+            ) -> float:
+    '''Best time, in seconds, to evaluate the curve once'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluate(curve)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(size: int):
+    '''Print evaluation time for a spline with size control points'''
+    curve = create_curve(size)
+
+    samples = with_forward_differences(curve).shape[:2]
+    flat_samples = sum(len(polyline) for polyline in with_flattening(curve))
+
+    loop = measure(with_forward_differences, curve)
+    flattening = measure(with_flattening, curve)
+
+    print(f'{size} control points')
+    print(f'forward differences: {loop * 1000:8.1f} ms, '
+          f'{samples[0] * samples[1]} samples at step {STEP}')
+    print(f'         flattening: {flattening * 1000:8.1f} ms, '
+          f'{flat_samples} samples within {TOLERANCE} '
+          f'({loop / flattening:.0f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
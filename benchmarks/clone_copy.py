@@ -0,0 +1,88 @@
+'''Compare deepcopy and clone when rebuilding a scene for one frame
+
+Run from the repository root with:
+    python -m benchmarks.clone_copy [number_of_objects]
+'''
+import sys
+import time
+from copy import deepcopy
+from random import Random
+from typing import Callable, List
+
+from src.model.objects import Vertex, Point3D, Line, Wireframe
+
+
+def create_scene(size: int) -> List:
+    '''Create a scene with lines, wireframes and points'''
+    rnd = Random(0)
+    objects: List = []
+    for i in range(size):
+        kind = i % 3
+        if kind == 0:
+            objects.append(Line(f'l{i}',
+                                Vertex(rnd.random(), rnd.random(), 0),
+                                Vertex(rnd.random(), rnd.random(), 0)))
+        elif kind == 1:
+            objects.append(Wireframe(f'w{i}', [
+                Vertex(rnd.random(), rnd.random(), 0)
+                for _ in range(rnd.randint(3, 8))
+            ]))
+        else:
+            objects.append(Point3D(f'p{i}', rnd.random(), rnd.random(), 0))
+
+    return objects
+
+
+def new_geometry(obj) -> dict:
+    '''Geometry attributes to be set, as a projection pass would do'''
+    if isinstance(obj, Line):
+        return {'p1': Vertex(0, 0, 0), 'p2': Vertex(1, 1, 0)}
+
+    if isinstance(obj, Wireframe):
+        return {'points': [Vertex(p.x, p.y, 0) for p in obj.points]}
+
+    return {'x': 0, 'y': 0, 'z': 0}
+
+
+def with_deepcopy(obj, geometry: dict):
+    '''Copy the way the render passes used to'''
+    new_obj = deepcopy(obj)
+    for attribute, value in geometry.items():
+        setattr(new_obj, attribute, value)
+
+    return new_obj
+
+
+def with_clone(obj, geometry: dict):
+    '''Copy with structural sharing'''
+    return obj.clone(**geometry)
+
+
+def measure(copy_function: Callable, objects: List, geometries: List[dict],
+            repeat: int = 3) -> float:
+    '''Best time, in seconds, to copy every object once'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for obj, geometry in zip(objects, geometries):
+            copy_function(obj, geometry)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(size: int):
+    '''Print per-frame copy time for a scene with size objects'''
+    objects = create_scene(size)
+    geometries = [new_geometry(obj) for obj in objects]
+
+    deep = measure(with_deepcopy, objects, geometries)
+    clone = measure(with_clone, objects, geometries)
+
+    print(f'{size} objects, one copy of each per frame')
+    print(f'deepcopy: {deep * 1000:8.1f} ms/frame')
+    print(f'   clone: {clone * 1000:8.1f} ms/frame ({deep / clone:.0f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
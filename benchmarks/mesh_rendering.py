@@ -0,0 +1,75 @@
+'''Compare drawing a large OBJ mesh by its unique edges and face by face
+
+Run from the repository root with:
+    python -m benchmarks.mesh_rendering [faces_per_side]
+'''
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from src.control.controller import Controller, MeshRenderMode
+
+
+def create_obj_file(folder: str, size: int) -> str:
+    '''Write a .obj file with a size x size grid of quad faces, a bit larger
+    than the default window, and return its path'''
+    step = 640 / size
+    lines = []
+    for i in range(size + 1):
+        for j in range(size + 1):
+            lines.append(f'v {-320 + i * step} {-320 + j * step} {(i * j) % 7}')
+
+    lines.append('o mesh')
+    for i in range(size):
+        for j in range(size):
+            first = i * (size + 1) + j + 1
+            lines.append(f'f {first} {first + 1} '
+                         f'{first + size + 2} {first + size + 1}')
+
+    path = os.path.join(folder, 'mesh.obj')
+    with open(path, 'w') as obj_file:
+        obj_file.write('\n'.join(lines) + '\n')
+
+    return path
+
+
+def measure(controller: Controller, mode: MeshRenderMode, repeat: int = 3
+            ) -> float:
+    '''Best time, in seconds, to process the viewport once in mode'''
+    controller.mesh_render_mode = mode
+
+    # First frame builds the cached edge list, it is not measured
+    controller.render_now()
+
+    best = float('inf')
+    for _ in range(repeat):
+        # The last frame is forgotten, so every frame is processed again
+        controller.invalidate_frame()
+
+        start = time.perf_counter()
+        controller.render_now()
+        controller.main_window.viewport.repaint()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(size: int):
+    '''Print per-frame time for a mesh with size x size faces'''
+    controller = Controller()
+    with tempfile.TemporaryDirectory() as folder:
+        controller.import_from_file(create_obj_file(folder, size))
+
+    faces = measure(controller, MeshRenderMode.FACES)
+    edges = measure(controller, MeshRenderMode.EDGES)
+
+    print(f'{size * size} faces, processed and painted once per frame')
+    print(f'Faces: {faces * 1000:8.1f} ms/frame')
+    print(f'Edges: {edges * 1000:8.1f} ms/frame ({faces / edges:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 224)
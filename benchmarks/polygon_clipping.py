@@ -0,0 +1,62 @@
+'''Compare Weiler-Atherton and Sutherland-Hodgman clipping on a dense mesh
+
+Run from the repository root with:
+    python -m benchmarks.polygon_clipping [faces_per_side]
+'''
+import sys
+import time
+from typing import List
+
+from src.model.objects import Vertex, Wireframe
+from src.tools.clipper import Clipper, ClipperSetup, PolygonClippingMode
+
+
+def create_mesh(size: int) -> List[Wireframe]:
+    '''Create size x size quad faces covering more than the window, so both
+    inside, outside and crossing faces are present'''
+    step = 3 / size
+    faces = []
+    for i in range(size):
+        for j in range(size):
+            x = -1.5 + i * step
+            y = -1.5 + j * step
+            faces.append(Wireframe(f'f{i}_{j}', [
+                Vertex(x, y, 0),
+                Vertex(x, y + step, 0),
+                Vertex(x + step, y + step, 0),
+                Vertex(x + step, y, 0)
+            ]))
+
+    return faces
+
+
+def measure(clipper: Clipper, faces: List[Wireframe], repeat: int = 3
+            ) -> float:
+    '''Best time, in seconds, to clip every face once'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        clipper.clip_objects(faces)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(size: int):
+    '''Print per-frame clipping time for a mesh with size x size faces'''
+    faces = create_mesh(size)
+    setup = ClipperSetup(xmax=1, xmin=-1, ymax=1, ymin=-1)
+
+    weiler = measure(
+        Clipper(setup, PolygonClippingMode.WEILER_ATHERTON), faces)
+    sutherland = measure(
+        Clipper(setup, PolygonClippingMode.SUTHERLAND_HODGMAN), faces)
+
+    print(f'{len(faces)} faces, clipped once per frame')
+    print(f'   Weiler-Atherton: {weiler * 1000:8.1f} ms/frame')
+    print(f'Sutherland-Hodgman: {sutherland * 1000:8.1f} ms/frame '
+          f'({weiler / sutherland:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,74 @@
+'''Compare memory and allocation time of Point3D and Vertex
+
+Run from the repository root with:
+    python -m benchmarks.vertex_memory [number_of_points]
+'''
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from src.model.objects import Point3D, Vertex
+
+
+def _rss_bytes() -> Optional[int]:
+    '''Resident memory of the process, when /proc is available'''
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+
+    return pages * 4096
+
+
+def measure(create: Callable[[int], object], size: int) -> dict:
+    '''Allocate size points with create and return time and memory used'''
+    gc.collect()
+    start = time.perf_counter()
+    points: List = [create(i) for i in range(size)]
+    elapsed = time.perf_counter() - start
+
+    del points
+    gc.collect()
+
+    # Memory is measured on a second run, tracing slows allocation down
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    points = [create(i) for i in range(size)]
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_bytes()
+
+    del points
+    gc.collect()
+
+    return {
+        'seconds': elapsed,
+        'traced': traced,
+        'rss': None if rss_before is None else rss_after - rss_before,
+    }
+
+
+def main(size: int):
+    '''Print the comparison for a scene with size points'''
+    results = {
+        'Vertex': measure(lambda i: Vertex(i, i, i), size),
+        'Point3D': measure(lambda i: Point3D('__p', i, i, i), size),
+    }
+
+    print(f'{size} points')
+    for name, result in results.items():
+        rss = result['rss']
+        rss_text = 'n/a' if rss is None else f'{rss / size:.0f} B/point'
+        print(f'{name:>8}: {result["seconds"]:.2f} s, '
+              f'{result["traced"] / size:.0f} B/point traced '
+              f'(python heap), {rss_text} resident')
+
+    print('Traced memory leaves out the C++ side of QColor, which shows '
+          'up only in the resident figure')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -1,21 +1,32 @@
 '''Cotroller class'''
 import sys
 import os
-from typing import List, Union, Tuple
-from math import cos, sin, radians, tan
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Union, Tuple
+from math import ceil, cos, floor, log2, sin, radians, tan
+from threading import Event
+from time import perf_counter
 from enum import Enum, auto
+from itertools import compress
 
+import numpy as np
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import (QApplication, QMessageBox,
                              QColorDialog, QFileDialog)
 from PyQt5.QtGui import QColor
 from loguru import logger
 
-from src.control.transform import Transformator, Normalizer, Projector
+from src.control.transform import (Transformator, Normalizer, Projector,
+                                   concat_transformation_matrixes,
+                                   get_viewport_matrix, project_samples)
+from src.control.render_worker import RenderWorker, check_cancelled
 from src.model import new_object_factory
-from src.model.objects import Point3D, Line, Wireframe, BezierCurve, BSplineCurve, Object3D, BicubicSurface
+from src.model.geometry_store import GeometryStore, GeometryType
+from src.model.objects import Vertex, Point3D, Line, Wireframe, BezierCurve, BSplineCurve, Object3D, BicubicSurface
 from src.model.objects import ViewportObjectRepresentation, BezierCurveSetup, BicubicSetup
+from src.model.objects import BaseCurve, LineSet, polyline_lines
 from src.tools.wavefront_reader import read_wavefront
-from src.tools.clipper import Clipper, ClipperSetup
+from src.tools.clipper import Clipper, ClipperSetup, PolygonClippingMode
+from src.tools.spatial_index import UniformGrid
 from src.view.main_window import MainWindow
 from src.view.dialog import NewObjectDialog, TransformationDialog
 from src.view.object_item import ObjectItem
@@ -26,6 +37,66 @@ class _ProjectionType(Enum):
     PERSPECTIVE = auto()
 
 
+class MeshRenderMode(Enum):
+    '''How the faces of 3D objects are drawn'''
+    EDGES = auto()
+    FACES = auto()
+
+
+class FrameSettings(NamedTuple):
+    '''Everything besides the camera a frame is drawn with'''
+    curve_tolerance: float
+    surface_samples: int
+    mesh_render_mode: MeshRenderMode
+    back_face_culling: bool
+    polygon_clipping_mode: PolygonClippingMode
+    face_clipping_mode: PolygonClippingMode
+    # xvp_min, yvp_min, xvp_max, yvp_max
+    viewport: Tuple[float, float, float, float]
+
+
+class _FrameKind(Enum):
+    '''How a frame is made on top of the last one'''
+    # Same camera, only changed objects are processed
+    CHANGES = auto()
+    # Pan or zoom, the last frame is moved and its border processed
+    WINDOW = auto()
+    FULL = auto()
+
+
+class _FramePlan(NamedTuple):
+    '''Work to draw a frame, taken from the controller when the frame is
+    asked for, so it can be processed away from the UI thread'''
+    kind: _FrameKind
+    camera: tuple
+    settings: FrameSettings
+    view_matrix: np.ndarray
+    projector: Projector
+    # Clippers of the wireframes of the display file, and of 3D object faces
+    clipper: Clipper
+    face_clipper: Clipper
+    eye: Optional[np.ndarray]
+    # Objects going through the pipeline, and their display file positions
+    geometry: GeometryStore
+    indexes: np.ndarray
+    # Objects whose pieces are replaced, none for full frames, which
+    # replace every piece
+    names: List[str]
+    # Versions of the objects the frame is made from
+    versions: Dict[str, int]
+    # Normalized bounds of the objects the frame keeps, NaN for the others
+    bounds: np.ndarray
+    # Move of the last frame pieces, in viewport coordinates
+    window_change: Optional[np.ndarray]
+
+
+class RenderedFrame(NamedTuple):
+    '''Pipeline output for a frame plan, never changed once made'''
+    representations: Tuple[ViewportObjectRepresentation, ...]
+    # (G, 2, 3) normalized bounds of the processed objects
+    bounds: np.ndarray
+
+
 class Controller:
     """
     Controller for application
@@ -35,6 +106,28 @@ class Controller:
         # Init the models structure
         self.display_file = []
 
+        # Packed vertices of the display file, used by the render pipeline
+        self.geometry = GeometryStore()
+
+        # Version of each object, by name, bumped on every change. The
+        # viewport keeps the pieces of the last frame, and the version each
+        # object was drawn with is kept here, valid while the camera is the
+        # same
+        self._versions: Dict[str, int] = {}
+        self._objects_by_name: Dict[str, object] = {}
+        self._changed_names: Set[str] = set()
+        self._frame_versions: Dict[str, int] = {}
+        self._frame_camera: Optional[tuple] = None
+
+        # View matrix of the last frame, and the (G, 2, 3) normalized bounds
+        # of the objects it processed, NaN for the others. A pan or a zoom
+        # only moves the objects that stay fully inside or outside the window
+        self._frame_view_matrix: Optional[np.ndarray] = None
+        self._frame_bounds: np.ndarray = np.empty((0, 2, 3))
+
+        # World space grid over the geometry bounds, for view culling
+        self.spatial_index = UniformGrid()
+
         # Angle between the Vup vector and the world Y axis
         self._vup_angle_degrees = 0
 
@@ -75,6 +168,43 @@ class Controller:
         self.xvp_max = 590  # it was 600, changed for clipping proof
         self.yvp_max = 590  # it was 600, changed for clipping proof
 
+        # Maximum distance, in viewport pixels, between curves and the
+        # lines drawn for them
+        self.curve_tolerance_px = 0.5
+
+        # Samples along s and t of the grid drawn for bicubic surfaces
+        self.surface_samples = 16
+
+        # 3D objects are drawn as their unique edges, or face by face
+        self.mesh_render_mode = MeshRenderMode.EDGES
+
+        # Faces of 3D objects turned away from the viewer are not drawn.
+        # Off by default, open meshes would lose their back side
+        self.back_face_culling = False
+
+        # Wireframes of the display file may be concave, so they are clipped
+        # by Weiler-Atherton, which splits them in separate pieces. Faces of
+        # 3D objects are convex, and clipped all at once by the vectorized
+        # Sutherland-Hodgman
+        self.polygon_clipping_mode = PolygonClippingMode.WEILER_ATHERTON
+        self.face_clipping_mode = PolygonClippingMode.SUTHERLAND_HODGMAN
+
+        # Renders asked by the interface wait on a single shot timer, so a
+        # burst of clicks is drawn once, at most once per frame interval
+        self.frame_interval_ms = 16
+        self._render_timer = QTimer()
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._flush_render)
+        self._last_render = float('-inf')
+
+        # Frames asked by the interface are processed on a worker thread,
+        # one at a time, and drawn when handed back to the UI thread
+        self._render_worker = RenderWorker(self._render_frame)
+        self._render_worker.finished.connect(self._frame_finished)
+        self._frame_in_flight: Optional[_FramePlan] = None
+        self._render_again = False
+        self.app.aboutToQuit.connect(self._stop_render_worker)
+
         # self.add_object_to_list(
         #    BSplineCurve('Spline',
         #                 points=[
@@ -234,7 +364,7 @@ class Controller:
             self.add_object_to_list(new_object)
             self.add_object_dialog.reset_values()
             self.add_object_dialog.setVisible(False)
-            self._process_viewport()
+            self._request_render()
 
         else:
             QMessageBox.information(
@@ -340,7 +470,7 @@ class Controller:
     def _set_proj_type(self, proj_type: _ProjectionType):
         self._proj_type = proj_type
 
-        self._process_viewport()
+        self._request_render()
 
     def _modify_z(self, direction: str):
         '''Increase or decrease Z of the window'''
@@ -363,7 +493,7 @@ class Controller:
         else:
             self._vrp_z -= step
 
-        self._process_viewport()
+        self._request_render()
 
     def _pos_rotate_VPN(self, axis: str):
         '''Modify VPN'''
@@ -371,7 +501,7 @@ class Controller:
         trans = Transformator(self._vpn_dir)
         self._vpn_dir = trans.rotate_by_degrees_origin(angle, axis)
 
-        self._process_viewport()
+        self._request_render()
 
     def _neg_rotate_VPN(self, axis: str):
         '''Modify VPN'''
@@ -379,18 +509,18 @@ class Controller:
         trans = Transformator(self._vpn_dir)
         self._vpn_dir = trans.rotate_by_degrees_origin(angle, axis)
 
-        self._process_viewport()
+        self._request_render()
 
     def _import_from_file_handler(self):
         '''Get the .obj filepath and call the proper load functions'''
 
         file = QFileDialog.getOpenFileName()[0]
         if file != '':
-            self._import_from_file(file)
-            self._process_viewport()
+            self.import_from_file(file)
+            self._request_render()
 
-    def _import_from_file(self, file: str):
-        '''Call wavefront loaders'''
+    def import_from_file(self, file: str):
+        '''Add the objects of a wavefront .obj file to the display file'''
         geoms = read_wavefront(file)
 
         for name, props in geoms.items():
@@ -398,15 +528,15 @@ class Controller:
                 logger.error(f'Failed to load: {name}, no vertexes and its not a curve!')
                 continue
 
-            points: List[Point3D] = []
+            points: List[Vertex] = []
             if 'v' in props:
                 # its a point, line or polygon
                 for x,y,z in props['v']:
-                    points.append(Point3D(name='', x=x, y=y, z=z))
+                    points.append(Vertex(x=x, y=y, z=z))
             
             if 'curv2' in props:
                 for x, y, z in props['curv2']:
-                    points.append(Point3D(name='', x=x, y=y, z=z))
+                    points.append(Vertex(x=x, y=y, z=z))
 
             color = QColor(0, 0, 0)
             if 'material' in props and 'Kd' in props['material']:
@@ -424,8 +554,7 @@ class Controller:
 
             if len(points) == 1:
                 # Is a point
-                point = points[0]
-                point.name = name
+                point = Point3D(name, *points[0].as_tuple())
                 point.color = color
                 self.add_object_to_list(point)
 
@@ -546,7 +675,7 @@ class Controller:
         else:
             self._rotate_right(angle)
 
-        self._process_viewport()
+        self._request_render()
 
     def _rotate_left(self, angle: int):
         '''Rotate vup to left'''
@@ -568,8 +697,9 @@ class Controller:
         for obj in self.display_file:
             if obj.name == item_name:
                 obj.color = color
+                self._mark_changed(obj)
                 break
-        self._process_viewport()
+        self._request_render()
 
     def _transformation_dialog(self):
         """
@@ -648,7 +778,7 @@ class Controller:
             self.window_ymax -= step * sen_vup
             self.window_ymin -= step * sen_vup
 
-        self._process_viewport()
+        self._request_render()
 
     def _zoom_handler(self, mode: str):
         """
@@ -690,7 +820,7 @@ class Controller:
             self.window_ymin -= step/2
 
         # Update objects on viewport
-        self._process_viewport()
+        self._request_render()
 
     def create_unique_obj_name(self, tab_name):
         """
@@ -710,14 +840,105 @@ class Controller:
         Add new object to objects list and to view object list
         """
         self.display_file.append(obj)
+        self.geometry.add(obj)
+        self._update_spatial_index(obj)
+        self._mark_changed(obj)
 
         item = ObjectItem(obj)
         self.main_window.items_model.appendRow(item)
 
+    def _mark_changed(self, obj):
+        '''Bump the version of an object, so its cached frame pieces are
+        processed again on the next frame'''
+        self._versions[obj.name] = self._versions.get(obj.name, 0) + 1
+        self._objects_by_name[obj.name] = obj
+        self._changed_names.add(obj.name)
+
+    def _update_spatial_index(self, obj):
+        '''Put the stored world bounds of an object into the grid'''
+        self.spatial_index.update(self.geometry.index_of(obj),
+                                  self.geometry.box_of(obj))
+
+    def invalidate_frame(self):
+        '''Forget the last frame, so the next one processes every object
+        again instead of reusing it'''
+        self._frame_camera = None
+
+    def render_now(self):
+        '''Process the viewport right away, on the calling thread, instead
+        of waiting for the next frame interval'''
+        self._render_timer.stop()
+        self._process_viewport()
+
+    def _request_render(self):
+        '''Mark the viewport as out of date. It is processed once the
+        queued events are handled, and not before a frame interval has
+        passed since the last render, so requests made meanwhile share it'''
+        if self._render_timer.isActive():
+            return
+
+        elapsed_ms = (perf_counter() - self._last_render) * 1000
+        self._render_timer.start(
+            ceil(max(0, self.frame_interval_ms - elapsed_ms)))
+
+    def _flush_render(self):
+        '''Start a frame for every render requested so far. A frame still
+        being processed is out of date, so it is cancelled, and the new one
+        starts once it stops'''
+        self._last_render = perf_counter()
+        if self._frame_in_flight is not None:
+            self._render_worker.cancel()
+            self._render_again = True
+            return
+
+        self._start_frame()
+
+    def _start_frame(self):
+        '''Plan a frame from the current state and hand it to the worker'''
+        self._render_again = False
+        plan = self._plan_frame()
+        if plan is not None:
+            self._frame_in_flight = plan
+            self._render_worker.submit(plan)
+
+    def _frame_finished(self, plan: _FramePlan,
+                        frame: Optional[RenderedFrame]):
+        '''Receive, on the UI thread, a frame done by the worker'''
+        if plan is not self._frame_in_flight:
+            # Dropped by a synchronous render meanwhile
+            return
+
+        self._frame_in_flight = None
+        if frame is not None:
+            self._commit_frame(plan, frame)
+
+        if self._render_again:
+            self._start_frame()
+
+    def _stop_render_worker(self):
+        '''Stop the worker thread before the application quits'''
+        self._frame_in_flight = None
+        self._render_worker.shutdown()
+
     def _process_viewport(self):
         """
-        Function to create the window that will be drew into viewport
+        Function to create the window that will be drew into viewport.
+        The frame is processed right away, on the calling thread
         """
+        if self._frame_in_flight is not None:
+            # The worker only stops at a stage boundary, and must not fill
+            # the object caches at the same time as this thread
+            self._render_worker.cancel()
+            self._render_worker.wait()
+            self._frame_in_flight = None
+
+        plan = self._plan_frame()
+        if plan is not None:
+            self._commit_frame(plan, self._render_frame(plan))
+
+    def _plan_frame(self) -> Optional[_FramePlan]:
+        '''Take from the current state the work needed to draw a frame on
+        top of the last one, or None if it is up to date'''
 
         # gx = Line('gy',
         #           Point3D('_gy1', -10000, 0, 0),
@@ -739,124 +960,446 @@ class Controller:
 
         # to_project_objects = grid + self.display_file
         projector = Projector(self.VPN)
-        projector.set_objects(self.display_file)
-        if self._proj_type == _ProjectionType.PARALEL:
-            to_normalize_objects = projector.project_paralel()
 
-        else:  # self._proj_type == _ProjectionType.PERSPECTIVE:
+        d_value = None
+        if self._proj_type == _ProjectionType.PERSPECTIVE:
             opening_angle = 150
             window_width = (self.window_xmax - self.window_xmin)
             d_value = window_width / tan(radians(opening_angle/2))
 
-            to_normalize_objects = projector.project_perspective(
-                d_value=d_value)
-
-        normalized_display_file = self.get_normalized_display_file(
-            to_normalize_objects)
+        # Projection, translation back and normalization as a single
+        # matrix, so each vertex is transformed once per frame
+        view_matrix = concat_transformation_matrixes([
+            projector.get_projection_matrix(d_value),
+            self._get_normalizer().normalization_matrix
+        ])
 
-        # Create clipper for normalized coordinates  system
+        # Create clippers for normalized coordinates  system
         clipper_setup = ClipperSetup(xmax=1, xmin=-1, ymax=1, ymin=-1)
-        clipper = Clipper(clipper_setup)
-
-        clipped_normalized_display_file = clipper.clip_objects(
-            normalized_display_file)
-
-        transformed_groups_of_points: List[ViewportObjectRepresentation] = []
-
-        # print('clipped_normalized_display_file')
-        # print()
-
-        for obj in clipped_normalized_display_file:
-            if isinstance(obj, Point3D):
-                transformed_groups_of_points.append(
-                    ViewportObjectRepresentation(
-                        name=obj.name,
-                        points=[self.viewpoert_transform_point(obj)],
-                        color=obj.color,
-                        thickness=obj.thickness)
-                )
-
-            else:
-                pts = []
-                for p in obj.points:
-                    # print(p)
-                    pts.append(self.viewpoert_transform_point(p))
-                transformed_groups_of_points.append(
-                    ViewportObjectRepresentation(name=obj.name,
-                                                 points=pts,
-                                                 color=obj.color,
-                                                 thickness=obj.thickness)
-                )
-
-        self.main_window.viewport.draw_objects(transformed_groups_of_points)
-
-    def get_normalized_display_file(self, objects: List
-                                    ) -> List[Union[Point3D, Line, Wireframe]]:
-        '''Take internal Vup vector and rotate grid and internal list of objects'''
+        clipper = Clipper(clipper_setup, self.polygon_clipping_mode)
+        face_clipper = Clipper(clipper_setup, self.face_clipping_mode)
+
+        eye = projector.get_eye(d_value) if self.back_face_culling else None
+
+        settings = self._frame_settings()
+        camera = (view_matrix.tobytes(), self._proj_type, settings)
+
+        changed = [name for name in self._changed_names
+                   if self._frame_versions.get(name) != self._versions[name]]
+        versions = {name: self._versions[name] for name in changed}
+
+        if camera == self._frame_camera:
+            # Same camera, so only objects changed since the last frame go
+            # through the pipeline again, and are swapped in the viewport
+            if not changed:
+                self._changed_names.clear()
+                return None
+
+            indexes = np.array(sorted(
+                self.geometry.index_of(self._objects_by_name[name])
+                for name in changed), dtype=int)
+
+            return _FramePlan(
+                kind=_FrameKind.CHANGES, camera=camera, settings=settings,
+                view_matrix=view_matrix, projector=projector,
+                clipper=clipper, face_clipper=face_clipper, eye=eye,
+                geometry=self.geometry.subset(indexes), indexes=indexes,
+                names=changed, versions=versions,
+                bounds=self._grown_frame_bounds(), window_change=None)
+
+        delta = self._window_delta(view_matrix, settings)
+        if delta is not None:
+            return self._plan_window_change(
+                delta, camera, settings, projector, view_matrix, clipper,
+                face_clipper, eye, changed, versions)
+
+        # Only objects in grid cells seen by the window are projected.
+        # Every object is drawn with its version, culled ones included
+        indexes = self.spatial_index.query(view_matrix, clipper)
+
+        return _FramePlan(
+            kind=_FrameKind.FULL, camera=camera, settings=settings,
+            view_matrix=view_matrix, projector=projector, clipper=clipper,
+            face_clipper=face_clipper, eye=eye,
+            geometry=self.geometry.subset(indexes), indexes=indexes,
+            names=[], versions=dict(self._versions),
+            bounds=np.full((len(self.geometry), 2, 3), np.nan),
+            window_change=None)
+
+    def _render_frame(self, plan: _FramePlan,
+                      cancel: Optional[Event] = None) -> RenderedFrame:
+        '''Take the objects of a plan through the pipeline. Settings come
+        from the plan, not the controller, so it can run on the worker
+        thread while the interface changes them'''
+        representations, bounds = self._process_geometry(
+            plan.geometry, plan.projector, plan.view_matrix, plan.clipper,
+            plan.eye, plan.settings, cancel, plan.face_clipper)
+        bounds.setflags(write=False)
+
+        return RenderedFrame(tuple(representations), bounds)
+
+    def _commit_frame(self, plan: _FramePlan, frame: RenderedFrame):
+        '''Record a rendered frame as the last one and draw it'''
+        bounds = plan.bounds.copy()
+        bounds[plan.indexes] = frame.bounds
+        self._frame_bounds = bounds
+        self._frame_camera = plan.camera
+        self._frame_view_matrix = plan.view_matrix
+
+        if plan.kind == _FrameKind.FULL:
+            self._frame_versions = dict(plan.versions)
+        else:
+            self._frame_versions.update(plan.versions)
+
+        # Objects changed again while the frame was processed stay pending
+        self._changed_names = {
+            name for name in self._changed_names
+            if self._frame_versions.get(name) != self._versions[name]}
+
+        viewport = self.main_window.viewport
+        if plan.kind == _FrameKind.FULL:
+            viewport.draw_objects(
+                list(frame.representations),
+                self._places({obj.name for obj in frame.representations}))
+            return
 
+        if plan.window_change is not None:
+            viewport.move_objects(plan.window_change)
+
+        viewport.replace_objects(
+            self._split_frame_pieces(plan.names, frame.representations),
+            self._places(plan.names))
+
+    def _split_frame_pieces(
+            self, names: Iterable[str],
+            representations: List[ViewportObjectRepresentation]
+    ) -> Dict[str, List[ViewportObjectRepresentation]]:
+        '''Split the viewport pieces of a frame by object name, with an
+        empty list for names without pieces'''
+        pieces_by_name = {name: [] for name in names}
+        for representation in representations:
+            pieces_by_name[representation.name].append(representation)
+
+        return pieces_by_name
+
+    def _places(self, names: Iterable[str]) -> Dict[str, int]:
+        '''Return the display file position of objects, by name, so they
+        are drawn in that order however they reach the viewport'''
+        return {name: self.geometry.index_of(self._objects_by_name[name])
+                for name in names}
+
+    def _grown_frame_bounds(self) -> np.ndarray:
+        '''Frame bounds with a NaN row for each object added after them'''
+        missing = len(self.geometry) - len(self._frame_bounds)
+        return np.concatenate([self._frame_bounds,
+                               np.full((missing, 2, 3), np.nan)])
+
+    def _window_delta(self, view_matrix: np.ndarray, settings: tuple
+                      ) -> Optional[np.ndarray]:
+        '''Return the matrix taking the normalized coordinates of the last
+        frame to the ones of view_matrix, if it only scales and moves them
+        along each axis, as a pan or a zoom does in parallel projection.
+        Both frames must be parallel, the perspective matrix is singular'''
+        if (self._proj_type != _ProjectionType.PARALEL
+                or self._frame_camera is None
+                or self._frame_camera[1] != _ProjectionType.PARALEL
+                or self._frame_camera[2] != settings):
+            return None
+
+        delta = np.linalg.inv(self._frame_view_matrix) @ view_matrix
+        expected = np.diag(np.diag(delta))
+        expected[3, :3] = delta[3, :3]
+
+        if (not np.allclose(delta, expected, rtol=0, atol=1e-9)
+                or not np.isclose(delta[3, 3], 1)
+                or (np.diag(delta)[:3] <= 0).any()):
+            return None
+
+        return expected
+
+    def _plan_window_change(self, delta: np.ndarray, camera: tuple,
+                            settings: FrameSettings, projector: Projector,
+                            view_matrix: np.ndarray, clipper: Clipper,
+                            face_clipper: Clipper,
+                            eye: Optional[np.ndarray], changed: List[str],
+                            versions: Dict[str, int]) -> _FramePlan:
+        '''Plan a frame whose normalized coordinates are the ones of the
+        last frame, mapped by delta. Objects fully inside the window, or
+        fully outside, before and after it are only moved in the viewport,
+        the other ones seen by the window go through the pipeline'''
+        bounds = self._grown_frame_bounds()
+        moved_bounds = np.sort(bounds * np.diag(delta)[:3] + delta[3, :3],
+                               axis=1)
+
+        old_inside, old_outside = clipper.classify_bounds(bounds)
+        new_inside, new_outside = clipper.classify_bounds(moved_bounds)
+        kept = (old_inside & new_inside) | (old_outside & new_outside)
+        kept[[self.geometry.index_of(self._objects_by_name[name])
+              for name in changed]] = False
+
+        seen = np.zeros(len(bounds), dtype=bool)
+        seen[self.spatial_index.query(view_matrix, clipper)] = True
+
+        # Objects drawn in the last frame and no longer seen are removed
+        processed = np.flatnonzero(seen & ~kept)
+        removed = np.flatnonzero(
+            ~seen & ~kept & ~np.isnan(bounds).any(axis=(1, 2)))
+        moved_bounds[~kept] = np.nan
+
+        # The same change, on viewport coordinates
+        viewport_matrix = get_viewport_matrix(*settings.viewport)
+        window_change = np.identity(3)
+        window_change[[0, 1], [0, 1]] = np.diag(delta)[:2]
+        window_change[2, :2] = delta[3, :2]
+
+        objects = self.geometry.objects
+        names = [objects[index].name
+                 for index in np.concatenate([processed, removed]).tolist()]
+
+        return _FramePlan(
+            kind=_FrameKind.WINDOW, camera=camera, settings=settings,
+            view_matrix=view_matrix, projector=projector, clipper=clipper,
+            face_clipper=face_clipper, eye=eye,
+            geometry=self.geometry.subset(processed),
+            indexes=processed, names=names, versions=versions,
+            bounds=moved_bounds,
+            window_change=(np.linalg.inv(viewport_matrix) @ window_change
+                           @ viewport_matrix))
+
+    def _process_geometry(self, geometry: GeometryStore, projector: Projector,
+                          view_matrix: np.ndarray, clipper: Clipper,
+                          eye: Optional[np.ndarray],
+                          settings: Optional[FrameSettings] = None,
+                          cancel: Optional[Event] = None,
+                          face_clipper: Optional[Clipper] = None
+                          ) -> Tuple[List[ViewportObjectRepresentation],
+                                     np.ndarray]:
+        '''Take the objects of geometry through projection, normalization,
+        clipping and viewport mapping, all at once. Return their viewport
+        pieces and their (G, 2, 3) normalized bounds. Stops between stages
+        once cancel is set. 3D objects are clipped by face_clipper, if
+        given'''
+        if face_clipper is None:
+            face_clipper = clipper
+
+        projector.set_geometry(geometry)
+        normalized_vertices = projector.apply_matrix_to_geometry(view_matrix)
+
+        # Objects whose bounding box is fully inside the window skip the
+        # clipper, the ones fully outside are not even tessellated
+        bounds = geometry.bounds_of(normalized_vertices)
+        inside, outside = clipper.classify_bounds(bounds)
+        check_cancelled(cancel)
+
+        clipped_normalized_display_file = self.get_normalized_display_file(
+            geometry, normalized_vertices, view_matrix, inside, eye, settings)
+        check_cancelled(cancel)
+
+        # Only the faces of 3D objects go to the face clipper
+        crossing = ~(inside | outside)
+        is_object3d = np.array(
+            [geometry_type == GeometryType.OBJECT3D
+             for _, _, geometry_type in geometry.ranges], dtype=bool)
+        for selection, selection_clipper in (
+                (crossing & ~is_object3d, clipper),
+                (crossing & is_object3d, face_clipper)):
+            clipped_normalized_display_file.extend(
+                selection_clipper.clip_objects(
+                    self.get_normalized_display_file(
+                        geometry, normalized_vertices, view_matrix,
+                        selection, eye, settings)))
+        check_cancelled(cancel)
+
+        return (self.viewport_transform_objects(
+            clipped_normalized_display_file, settings), bounds)
+
+    def _get_normalizer(self) -> Normalizer:
+        '''Create normalizer for current window'''
         window_width = self.window_ymax - self.window_ymin
         window_height = self.window_xmax - self.window_xmin
 
-        normalizer = Normalizer(
+        return Normalizer(
             self.VRP,
             window_height,
             window_width,
             vup_angle=self._vup_angle_degrees
         )
 
+    def _frame_settings(self) -> FrameSettings:
+        '''Drawing settings of a frame made now'''
+        return FrameSettings(
+            curve_tolerance=self._curve_tolerance(),
+            surface_samples=self.surface_samples,
+            mesh_render_mode=self.mesh_render_mode,
+            back_face_culling=self.back_face_culling,
+            polygon_clipping_mode=self.polygon_clipping_mode,
+            face_clipping_mode=self.face_clipping_mode,
+            viewport=(self.xvp_min, self.yvp_min, self.xvp_max, self.yvp_max))
+
+    def _curve_tolerance(self) -> float:
+        '''Curve flatness tolerance in world units, taken from the pixel
+        tolerance and the window size. It is snapped down to a power of two,
+        so close zoom levels share the cached tessellations'''
+        pixel_size = max(
+            (self.window_xmax - self.window_xmin) / (self.xvp_max - self.xvp_min),
+            (self.window_ymax - self.window_ymin) / (self.yvp_max - self.yvp_min))
+
+        return 2.0 ** floor(log2(self.curve_tolerance_px * pixel_size))
+
+    def get_normalized_display_file(self, geometry: GeometryStore,
+                                    vertices: np.ndarray,
+                                    view_matrix: np.ndarray,
+                                    selection: Optional[np.ndarray] = None,
+                                    eye: Optional[np.ndarray] = None,
+                                    settings: Optional[FrameSettings] = None
+                                    ) -> List[Union[Point3D, Line, Wireframe]]:
+        '''Rebuild the display file objects from the normalized vertices of
+        geometry, switching composed objects by their lines and wireframes.
+        Curves are switched by their cached world tessellation, taken to
+        normalized coordinates by view_matrix. Only objects set in the
+        selection mask are rebuilt, if given, and faces of 3D objects turned
+        away from the eye, a homogeneous world position, are culled. The
+        current settings are used if none are given'''
+        if settings is None:
+            settings = self._frame_settings()
+
+        if selection is None:
+            indexes = range(len(geometry))
+        else:
+            indexes = np.flatnonzero(selection).tolist()
+
+        world_objects = geometry.objects
+
         objects_list = []
-        step = 0.01
-        for obj in objects:
-            if isinstance(obj, BezierCurve) or isinstance(obj, BSplineCurve):
-                # Switch the curve by its lines
-                objects_list.extend(obj.calculate_lines(step))
+        tolerance = settings.curve_tolerance
+        for index in indexes:
+            world_obj = world_objects[index]
+            if isinstance(world_obj, BaseCurve):
+                # Switch the curve by its lines, a camera change only
+                # projects the samples again. Their z is kept for clipping,
+                # and samples behind the projection center are dropped
+                polylines = world_obj.flat_polylines(tolerance)
+                samples, in_front = project_samples(
+                    np.concatenate(polylines), view_matrix)
+
+                splits = np.cumsum([len(p) for p in polylines])[:-1]
+                objects_list.extend(polyline_lines(
+                    np.split(samples, splits), world_obj.thickness,
+                    world_obj.color, np.split(in_front, splits),
+                    world_obj.name))
+                continue
 
-            elif isinstance(obj, Object3D):
+            if isinstance(world_obj, BicubicSurface):
+                # Switch bicubic surface by the edges of its cached grid,
+                # projected all at once
+                grid, edges = world_obj.mesh(settings.surface_samples,
+                                             settings.surface_samples)
+                samples, in_front = project_samples(grid, view_matrix)
+
+                edges = edges[in_front[edges].all(axis=1)]
+                line_set = LineSet(world_obj.name, samples[edges],
+                                   world_obj.thickness)
+                line_set.color = world_obj.color
+                objects_list.append(line_set)
+                continue
+
+            front = None
+            if isinstance(world_obj, Object3D) and eye is not None:
+                # Back faces are found with the cached world normals
+                front = world_obj.front_faces(eye)
+
+            if (isinstance(world_obj, Object3D)
+                    and settings.mesh_render_mode == MeshRenderMode.FACES):
                 # Switch object 3d by its wireframes
-                objects_list.extend(obj.get_wireframes())
-            
-            elif isinstance(obj, BicubicSurface):
-                # Switch bicubic surface by it wireframe
-                objects_list.extend(obj.get_lines())
+                obj = geometry.build_at(index, vertices)
+                if front is not None:
+                    obj = obj.clone(faces=list(compress(obj.faces, front)))
+
+                # Pieces keep the object name, so the viewport can find them
+                for wireframe in obj.get_wireframes():
+                    wireframe.name = obj.name
+                    objects_list.append(wireframe)
+                continue
+
+            if isinstance(world_obj, Object3D):
+                # Switch object 3d by its unique edges, indexing the points
+                # it already has in the transformed vertices
+                offset, length, _ = geometry.range_of(world_obj)
+                points = vertices[offset:offset + length, :3]
+
+                edges = world_obj.unique_edges()
+                if front is not None:
+                    edges = edges[world_obj.edges_of_faces(front)]
 
-            else:
-                objects_list.append(obj)
+                line_set = LineSet(world_obj.name, points[edges],
+                                   world_obj.thickness)
+                line_set.color = world_obj.color
+                objects_list.append(line_set)
+                continue
+
+            objects_list.append(geometry.build_at(index, vertices))
 
-        return normalizer.normalize_objects(objects_list)
+        return objects_list
 
-    def viewpoert_transform_point(self, point: Point3D):
+    def viewport_transform_objects(self, objects: List[Union[Point3D, Line, Wireframe]],
+                                   settings: Optional[FrameSettings] = None
+                                   ) -> List[ViewportObjectRepresentation]:
         """
-        Apply viewport transformation to a point
+        Apply viewport transformation to normalized objects, with a single
+        matrix product for the points of all of them
 
         Parameters
         ----------
-        p: Point3D
+        objects: List[Union[Point3D, Line, Wireframe]]
+        settings: Optional[FrameSettings]
+            Settings with the viewport bounds, the current ones if not given
 
         Return
         ----------
-        UnamedPoint3D(x, y) transformed to current viewport
+        List of ViewportObjectRepresentation, in the same order
         """
+        if settings is None:
+            settings = self._frame_settings()
+
+        viewport_matrix = get_viewport_matrix(*settings.viewport)
+
+        groups = [
+            [] if isinstance(obj, LineSet)
+            else [obj] if isinstance(obj, Point3D) else obj.points
+            for obj in objects
+        ]
+        points = [p for group in groups for p in group]
+
+        coordinates = np.ones((len(points), 3))
+        coordinates[:, :2] = np.array(
+            [(p.x, p.y) for p in points], dtype=float).reshape(-1, 2)
+        mapped = (coordinates @ viewport_matrix).tolist()
+
+        representations: List[ViewportObjectRepresentation] = []
+        start = 0
+        for obj, group in zip(objects, groups):
+            if isinstance(obj, LineSet):
+                # Line sets stay as arrays, mapped by their own product
+                ends = np.ones((len(obj.segments) * 2, 3))
+                ends[:, :2] = obj.segments[:, :, :2].reshape(-1, 2)
+                representations.append(ViewportObjectRepresentation(
+                    name=obj.name,
+                    points=[],
+                    color=obj.color,
+                    thickness=obj.thickness,
+                    segments=(ends @ viewport_matrix)[:, :2].reshape(-1, 4)))
+                continue
 
-        # xwmax = self.window_xmax
-        # ywmax = self.window_ymax
-        # xwmin = self.window_xmin
-        # ywmin = self.window_ymin
-        xwmax = 1
-        ywmax = 1
-        xwmin = -1
-        ywmin = -1
-
-        xvpmax = self.xvp_max
-        yvpmax = self.yvp_max
-        xvpmin = self.xvp_min
-        yvpmin = self.yvp_min
-
-        xvp = ((point.x - xwmin)/(xwmax - xwmin)) * \
-            (xvpmax - xvpmin) + xvpmin
-        yvp = (1 - ((point.y - ywmin)/(ywmax - ywmin))) * \
-            (yvpmax - yvpmin) + yvpmin
+            end = start + len(group)
+            representations.append(ViewportObjectRepresentation(
+                name=obj.name,
+                points=[Vertex(x=x, y=y, z=p.z)
+                        for (x, y, _), p in zip(mapped[start:end], group)],
+                color=obj.color,
+                thickness=obj.thickness))
+            start = end
 
-        return Point3D(name=point.name, x=xvp, y=yvp, z=point.z)
+        return representations
 
     def apply_transformation_handler(self):
         '''Check active tab on transformation dialog and call correct handler
@@ -885,7 +1428,7 @@ class Controller:
 
         self.transform_dialog.reset_values()
         self.transform_dialog.setVisible(False)
-        self._process_viewport()
+        self._request_render()
 
     def reject_transformation_handler(self):
         '''Reset dialog'''
@@ -912,6 +1455,9 @@ class Controller:
         index = self.display_file.index(obj)
         self.display_file.pop(index)
         self.display_file.insert(index, new_obj)
+        self.geometry.replace(obj, new_obj)
+        self._update_spatial_index(new_obj)
+        self._mark_changed(new_obj)
 
     def transform_rotate(self, obj, tab):
         '''Apply rotate transformation'''
@@ -952,6 +1498,9 @@ class Controller:
         index = self.display_file.index(obj)
         self.display_file.pop(index)
         self.display_file.insert(index, new_obj)
+        self.geometry.replace(obj, new_obj)
+        self._update_spatial_index(new_obj)
+        self._mark_changed(new_obj)
 
     def transform_rescale(self, obj, tab):
         '''Apply scaling transformation'''
@@ -963,3 +1512,6 @@ class Controller:
         index = self.display_file.index(obj)
         self.display_file.pop(index)
         self.display_file.insert(index, new_obj)
+        self.geometry.replace(obj, new_obj)
+        self._update_spatial_index(new_obj)
+        self._mark_changed(new_obj)
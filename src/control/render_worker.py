@@ -0,0 +1,71 @@
+'''Background thread running the render pipeline away from the Qt UI thread'''
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event
+from typing import Callable, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from loguru import logger
+
+
+class FrameCancelled(Exception):
+    '''Raised inside a render whose frame is out of date'''
+
+
+def check_cancelled(cancel: Optional[Event]):
+    '''Stop a render, at a stage boundary, if its frame was cancelled'''
+    if cancel is not None and cancel.is_set():
+        raise FrameCancelled()
+
+
+class RenderWorker(QObject):
+    '''Run renders, one at a time, on a background thread
+
+    The render function takes a job and a cancel event, and returns a frame.
+    Each job ends with `finished`, emitted with the job and its frame, or
+    None if it was cancelled or failed. The signal is delivered in the
+    thread the worker was made in, the Qt UI thread.
+    '''
+
+    finished = pyqtSignal(object, object)
+
+    def __init__(self, render: Callable[[object, Event], object]):
+        super().__init__()
+        self._render = render
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='render')
+        self._cancel: Optional[Event] = None
+        self._future: Optional[Future] = None
+
+    def submit(self, job):
+        '''Start rendering a job once the previous one is over'''
+        self._cancel = Event()
+        self._future = self._executor.submit(self._run, job, self._cancel)
+
+    def cancel(self):
+        '''Stop the last submitted job at its next stage boundary'''
+        if self._cancel is not None:
+            self._cancel.set()
+
+    def wait(self):
+        '''Block until the last submitted job is over, so that nothing else
+        touches the objects it renders'''
+        if self._future is not None:
+            self._future.result()
+            self._future = None
+
+    def shutdown(self):
+        '''Cancel the last job and wait for the thread to stop'''
+        self.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job, cancel: Event):
+        '''Render a job on the worker thread and hand its frame over'''
+        try:
+            frame = self._render(job, cancel)
+        except FrameCancelled:
+            frame = None
+        except Exception:
+            logger.exception('Failed to render frame')
+            frame = None
+
+        self.finished.emit(job, frame)
@@ -1,31 +1,62 @@
 '''Transformations for objects'''
-from typing import List, Union, Tuple
+from typing import List, Union, Tuple, Optional
 from math import cos, sin, radians, atan, degrees, asin, sqrt, acos
 from statistics import mean
-from copy import deepcopy
 
 import numpy as np
-from src.model.objects import Point3D, Line, Wireframe, BezierCurve, BezierCurveSetup, BSplineCurve, Object3D, BicubicSurface, BicubicSetup
+from src.model.objects import Vertex, Point3D, Line, Wireframe, BezierCurve, BezierCurveSetup, BSplineCurve, Object3D
+from src.model.geometry_store import GeometryStore
 
 
-def transform(points: List[Point3D], matrix: np.ndarray) -> List[Point3D]:
-    '''Apply transformation'''
-    new_points: List[Point3D] = []
+def points_to_array(points: List[Vertex]) -> np.ndarray:
+    '''Pack points into a contiguous (N, 4) array of homogeneous coordinates'''
+    packed = np.ones((len(points), 4))
+    packed[:, :3] = np.array([(p.x, p.y, p.z) for p in points],
+                             dtype=float).reshape(-1, 3)
 
-    for point in points:
-        np_point = np.array([point.x, point.y, point.z, 1])
-        new_point = np_point.dot(matrix)
-        w = new_point[-1]
-        new_points.append(Point3D(
-            name=point.name,
-            x=new_point[0]/w,
-            y=new_point[1]/w,
-            z=new_point[2]/w
-        ))
+    return packed
+
+
+def transform_array(points: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    '''Apply transformation to a (N, 4) array of homogeneous points
+
+    The matrix is applied with a single product over every row and the
+    result is divided by w, so the returned array has w == 1.
+    '''
+    new_points = points @ matrix
+    new_points /= new_points[:, 3:]
 
     return new_points
 
 
+def project_samples(samples: np.ndarray, matrix: np.ndarray
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''Transform a (..., 3) array of points, keeping its leading shape.
+    Return the (..., 3) coordinates and a mask of the points in front of
+    the projection center, the ones with positive w'''
+    homogeneous = np.ones(samples.shape[:-1] + (4,))
+    homogeneous[..., :3] = samples
+
+    projected = homogeneous @ matrix
+    in_front = projected[..., 3] > 1e-9
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coordinates = projected[..., :3] / projected[..., 3:]
+
+    return coordinates, in_front
+
+
+def transform(points: List[Vertex], matrix: np.ndarray) -> List[Vertex]:
+    '''Apply transformation, keeping named points as Point3D'''
+    new_points = transform_array(points_to_array(points), matrix)
+
+    return [
+        Point3D(name=point.name, x=x, y=y, z=z)
+        if isinstance(point, Point3D) else Vertex(x, y, z)
+        for point, (x, y, z, _) in zip(points, new_points.tolist())
+    ]
+
+
 def get_translation_matrix(desloc_x: float, desloc_y: float, desloc_z: float) -> np.ndarray:
     '''Create the translation matrix from the deslocation vector'''
     return np.array(
@@ -98,6 +129,21 @@ def concat_transformation_matrixes(matrixes: List[np.ndarray]) -> np.ndarray:
     return final_matrix
 
 
+def get_viewport_matrix(xvp_min: float, yvp_min: float,
+                        xvp_max: float, yvp_max: float) -> np.ndarray:
+    '''Create the 3x3 matrix taking normalized (x, y, 1) rows, in the
+    -1..1 window, to viewport coordinates, with y growing downwards'''
+    half_width = (xvp_max - xvp_min) / 2
+    half_height = (yvp_max - yvp_min) / 2
+    return np.array(
+        [
+            [half_width, 0, 0],
+            [0, -half_height, 0],
+            [xvp_min + half_width, yvp_min + half_height, 1]
+        ]
+    )
+
+
 def rotate_points_over_point_by_degrees(points: List[Point3D],
                                         point: Point3D,
                                         angle: float,
@@ -237,10 +283,7 @@ class Transformator:
                     P4=new_points[3]
                 ))
 
-            new_curve = self._intern_copy
-            new_curve.curves = new_setups
-
-            return new_curve
+            return self._object.clone(curves=new_setups)
 
     def rotate_by_degrees_geometric_center(self, angle: float,
                                            rotation_axis: str
@@ -317,11 +360,7 @@ class Transformator:
                 P4=new_points[3]
             ))
 
-        new_curve = deepcopy(self._object)
-
-        new_curve.curves = new_setups
-
-        return new_curve
+        return self._object.clone(curves=new_setups)
 
     def _rotate_internal_bspline_curve_over_center(self, angle: float) -> BSplineCurve:
         '''Rotate intrnal BSpline and return copy of object'''
@@ -408,11 +447,7 @@ class Transformator:
                 P4=new_points[3]
             ))
 
-        new_curve = deepcopy(self._object)
-
-        new_curve.curves = new_setups
-
-        return new_curve
+        return self._object.clone(curves=new_setups)
 
     def _rotate_internal_line_over_origin(self, angle: float) -> Line:
         '''Rotate when internal is a Line and return copy of object'''
@@ -533,11 +568,7 @@ class Transformator:
                 P4=new_points[3]
             ))
 
-        new_curve = deepcopy(self._object)
-
-        new_curve.curves = new_setups
-
-        return new_curve
+        return self._object.clone(curves=new_setups)
 
     def _rotate_internal_line_over_point(self, angle: float,
                                          point: Point3D) -> Line:
@@ -672,11 +703,7 @@ class Transformator:
                 P4=new_points[3]
             ))
 
-        new_curve = deepcopy(self._object)
-
-        new_curve.curves = new_setups
-
-        return new_curve
+        return self._object.clone(curves=new_setups)
 
     def _translate_line_by_vector(self, desloc_x: float, desloc_y: float, desloc_z: float) -> Line:
         '''Translate internal object when is a line and return copy'''
@@ -796,11 +823,7 @@ class Transformator:
                 P4=new_points[3]
             ))
 
-        new_curve = deepcopy(self._object)
-
-        new_curve.curves = new_setups
-
-        return new_curve
+        return self._object.clone(curves=new_setups)
 
     def _scale_bspline_curve(self, scale_x: float, scale_y: float, scale_z: float) -> BSplineCurve:
         '''Scale internal when is a wireframe and return copy'''
@@ -841,8 +864,8 @@ class Transformator:
         return new_obj
 
     def _intern_copy(self) -> Union[Point3D, Line, Wireframe, BezierCurve]:
-        '''Return deepcopy of internal object'''
-        return deepcopy(self._object)
+        '''Return clone of internal object, geometry to be replaced'''
+        return self._object.clone()
 
 
 class Normalizer:
@@ -870,75 +893,10 @@ class Normalizer:
             get_scaling_matrix(1/self._window_width, 1/self._window_height, 1)
         ])
 
-    def normalize_objects(self, objects: List[Union[Point3D, Line, Wireframe]]
-                          ) -> List[Union[Point3D, Line, Wireframe]]:
-        '''Return objects in the normalized coordinates'''
-        normalized_objects: List[Union[Point3D, Line, Wireframe]] = []
-        for obj in objects:
-            normalized_objects.append(self.normalize_object(obj))
-
-        return normalized_objects
-
-    def normalize_object(self, obj: Union[Point3D, Line, Wireframe]
-                         ) -> Union[Point3D, Line, Wireframe]:
-        '''Direct a object to be transformed by specific function'''
-        if isinstance(obj, Point3D):
-            return self._normalize_point(obj)
-
-        if isinstance(obj, Line):
-            return self._normalize_line(obj)
-
-        if isinstance(obj, Wireframe):
-            return self._normalize_wireframe(obj)
-
-        # if isinstance(obj, BicubicSurface):
-        #     return self._normalize_bicubic_surface(obj)
-
-        raise TypeError(f'Invalid type for normalization: {obj}')
-
-    def _normalize_point(self, point: Point3D) -> Point3D:
-        '''Apply transformation to single point'''
-        return transform([point], self._normalization_matrix)[0]
-
-    def _normalize_line(self, line: Line) -> Line:
-        '''Apply normalization to line'''
-        points = transform(line.points, self._normalization_matrix)
-
-        new_line = deepcopy(line)
-        if not isinstance(new_line, Line):
-            raise TypeError('Internal object is not line')
-
-        new_line.p1 = points[0]
-        new_line.p2 = points[1]
-
-        return new_line
-
-    def _normalize_wireframe(self, wireframe: Wireframe) -> Wireframe:
-        '''Apply normalization to wireframe'''
-        points = transform(wireframe.points, self._normalization_matrix)
-
-        new_wireframe = deepcopy(wireframe)
-
-        if not isinstance(new_wireframe, Wireframe):
-            raise TypeError('Internal object is not wireframe')
-
-        new_wireframe.points = points
-
-        return new_wireframe
-    
-    # def _normalize_bicubic_surface(self, surface: BicubicSurface) -> BicubicSurface:
-    #     '''Apply normalization to bicubic surface'''
-    #     points = transform(surface.points, self._normalization_matrix)
-
-    #     new_surface = deepcopy(surface)
-
-    #     if not isinstance(new_surface, BicubicSurface):
-    #         raise TypeError('Internal object is not Bicubi surface')
-
-    #     new_surface.points = points
-
-    #     return new_surface
-
+    @property
+    def normalization_matrix(self) -> np.ndarray:
+        '''Matrix taking projected world coordinates to normalized ones'''
+        return self._normalization_matrix
 
 
 class Projector:
@@ -947,11 +905,11 @@ class Projector:
     def __init__(self, VPN: Tuple[Point3D, Point3D]):
         self.VRP = VPN[0]
         self.VPN_end = VPN[1]
-        self._objects = []
+        self._geometry = GeometryStore()
 
-    def set_objects(self, objects: Union[Point3D, Line, Wireframe,
-                                         BezierCurve, BSplineCurve, Object3D]):
-        self._objects = objects
+    def set_geometry(self, geometry: GeometryStore):
+        '''Set the packed scene geometry to be projected'''
+        self._geometry = geometry
 
     def get_paralel_transformation_matrix(self) -> np.array:
         '''Create the matrix to translate VRP to origin and align VPN with Z
@@ -979,92 +937,21 @@ class Projector:
 
         return concat_transformation_matrixes(matrixes)
 
-    def apply_matrix_to_objects(self, project_matrix: np.array
-                                ) -> Union[Point3D, Line, Wireframe,
-                                           BezierCurve,
-                                           BSplineCurve, Object3D]:
-        '''Apply matrix to intern list of objects'''
-        projected_objects = []
-        for obj in self._objects:
-            if isinstance(obj, Point3D):
-                new_point = transform([obj], project_matrix)[0]
-                new_point.color = obj.color
-                projected_objects.append(new_point)
-
-            elif isinstance(obj, Line):
-                new_points = transform(obj.points, project_matrix)
-                new_obj = deepcopy(obj)
-                new_obj.p1 = new_points[0]
-                new_obj.p2 = new_points[1]
-
-                projected_objects.append(new_obj)
-
-            elif isinstance(obj, Wireframe) or \
-                    isinstance(obj, Object3D) or isinstance(obj, BicubicSurface):
-                new_points = transform(obj.points, project_matrix)
-                new_obj = deepcopy(obj)
-                new_obj.points = new_points
-
-                projected_objects.append(new_obj)
-            
-            elif isinstance(obj, BSplineCurve):
-                new_points = transform(obj.control_points, project_matrix)
-                new_obj = deepcopy(obj)
-                new_obj.points = new_points
-
-                projected_objects.append(new_obj)
-
-            elif isinstance(obj, BezierCurve):
-                new_setups = []
-                for setup in obj.curves:
-                    points = [setup.P1, setup.P2, setup.P3, setup.P4]
-                    new_points = transform(points, project_matrix)
-                    new_setups.append(BezierCurveSetup(
-                        P1=new_points[0],
-                        P2=new_points[1],
-                        P3=new_points[2],
-                        P4=new_points[3]
-                    ))
-
-                new_curve = deepcopy(obj)
-                new_curve.curves = new_setups
-
-                projected_objects.append(new_curve)
-            
-            # elif isinstance(obj, BicubicSurface):
-            #     new_setups = []
-            #     setup = obj.setup
-            #     points = [setup.P1, setup.P2, setup.P3, setup.P4,setup.P5, setup.P6, setup.P7, setup.P8,setup.P9, setup.P10,
-            #                      setup.P11, setup.P12,setup.P13, setup.P14, setup.P15, setup.P16]
-            #     new_points = transform(points, project_matrix)
-            #     new_setups.append(BicubicSetup(
-            #         P1=new_points[0],
-            #         P2=new_points[1],
-            #         P3=new_points[2],
-            #         P4=new_points[3],
-            #         P5=new_points[4],
-            #         P6=new_points[5],
-            #         P7=new_points[6],
-            #         P8=new_points[7],
-            #         P9=new_points[8],
-            #         P10=new_points[9],
-            #         P11=new_points[2],
-            #         P12=new_points[3],
-            #         P13=new_points[0],
-            #         P14=new_points[1],
-            #         P15=new_points[2],
-            #         P16=new_points[3]
-            #     ))
-
-            #     new_surface = deepcopy(obj)
-            #     new_surface.setups = new_setups
-
-            #     projected_objects.append(new_surface)
-
-            else:
-                raise ValueError('Invalid object to project')
-
-        return projected_objects
+    def get_eye(self, d_value: Optional[float] = None) -> np.ndarray:
+        '''Get the world (4,) homogeneous position of the viewer. It is the
+        COP if d_value is given, otherwise the point at infinity opposite
+        to the projection direction'''
+        if d_value is None:
+            eye = np.array([0, 0, -1, 0])
+        else:
+            eye = np.array([0, 0, -d_value, 1])
+
+        return eye @ np.linalg.inv(self.get_paralel_transformation_matrix())
+
+    def apply_matrix_to_geometry(self, project_matrix: np.array
+                                 ) -> np.ndarray:
+        '''Apply matrix, in a single pass, to the intern scene vertices'''
+        return transform_array(self._geometry.vertices, project_matrix)
 
     def get_perspective_transformation_matrix(self, d_value: int) -> np.array:
         '''Get perspective transformation matrix'''
@@ -1083,26 +970,28 @@ class Projector:
 
         return perspective_transformation
 
-    def project_paralel(self) -> Union[Point3D, Line, Wireframe, BezierCurve,
-                                       BSplineCurve, Object3D]:
-        '''Apply project transformation over intern list objects'''
-        matrix = self.get_paralel_transformation_matrix()
-        projected = self.apply_matrix_to_objects(matrix)
-        # trasnlate back
-        self._objects = projected
-        return self.apply_matrix_to_objects(get_translation_matrix(
-            desloc_x=self.VRP.x,
-            desloc_y=self.VRP.y,
-            desloc_z=self.VRP.z))
-
-    def project_perspective(self, d_value: int) -> Union[Point3D, Line, Wireframe, BezierCurve,
-                                                         BSplineCurve, Object3D]:
-        '''Apply project transformation over intern list of objects'''
-        matrix = self.get_perspective_transformation_matrix(d_value)
-        projected = self.apply_matrix_to_objects(matrix)
+    def get_projection_matrix(self, d_value: Optional[float] = None
+                              ) -> np.array:
+        '''Get the whole projection, translation back to VRP included, as a
+        single matrix. Paralel if d_value is None, perspective otherwise'''
+        if d_value is None:
+            matrix = self.get_paralel_transformation_matrix()
+        else:
+            matrix = self.get_perspective_transformation_matrix(d_value)
+
         # trasnlate back
-        self._objects = projected
-        return self.apply_matrix_to_objects(get_translation_matrix(
-            desloc_x=self.VRP.x,
-            desloc_y=self.VRP.y,
-            desloc_z=self.VRP.z))
+        return concat_transformation_matrixes([
+            matrix,
+            get_translation_matrix(desloc_x=self.VRP.x,
+                                   desloc_y=self.VRP.y,
+                                   desloc_z=self.VRP.z)
+        ])
+
+    def project_paralel(self) -> np.ndarray:
+        '''Apply project transformation over intern scene vertices'''
+        return self.apply_matrix_to_geometry(self.get_projection_matrix())
+
+    def project_perspective(self, d_value: int) -> np.ndarray:
+        '''Apply project transformation over intern scene vertices'''
+        return self.apply_matrix_to_geometry(
+            self.get_projection_matrix(d_value))
@@ -2,7 +2,7 @@ from typing import List
 
 from PyQt5.QtWidgets import QWidget
 
-from src.model.objects import (Point3D, Line, Wireframe,
+from src.model.objects import (Vertex, Point3D, Line, Wireframe,
                                BezierCurve, BezierCurveSetup, BSplineCurve, Object3D, BicubicSetup, BicubicSurface)
 from src.view.dialog import LineTab, PointTab, CurveTab, WireframeTab, BSplineTab, _3dObjectTab, _BicubicTab
 
@@ -19,8 +19,8 @@ def create_line(name: str, tab: LineTab) -> Line:
     y2 = int(tab.end_y_coord_line_input.text())
     z2 = int(tab.end_z_coord_line_input.text())
 
-    p1 = Point3D('_p1', x1, y1, z1)
-    p2 = Point3D('_p2', x2, y2, z2)
+    p1 = Vertex(x1, y1, z1)
+    p2 = Vertex(x2, y2, z2)
 
     return Line(name, p1, p2)
 
@@ -42,7 +42,7 @@ def create_wireframe(name: str, tab: WireframeTab) -> Wireframe:
     points = []
     for i, point in enumerate(tab.points_list):
         x, y, z = point
-        point = Point3D('Po' + str(i).zfill(3), x, y, z)
+        point = Vertex(x, y, z)
         points.append(point)
 
     return Wireframe(name, points)
@@ -59,10 +59,10 @@ def create_curve(name: str, tab: CurveTab) -> BezierCurve:
         p3 = group['P3']
         p4 = group['P4']
         setup = BezierCurveSetup(
-            P1=Point3D('__', x=p1['x'], y=p1['y'], z=p1['z']),
-            P2=Point3D('__', x=p2['x'], y=p2['y'], z=p2['z']),
-            P3=Point3D('__', x=p3['x'], y=p3['y'], z=p3['z']),
-            P4=Point3D('__', x=p4['x'], y=p4['y'], z=p4['z']),
+            P1=Vertex(x=p1['x'], y=p1['y'], z=p1['z']),
+            P2=Vertex(x=p2['x'], y=p2['y'], z=p2['z']),
+            P3=Vertex(x=p3['x'], y=p3['y'], z=p3['z']),
+            P4=Vertex(x=p4['x'], y=p4['y'], z=p4['z']),
         )
 
         setups.append(setup)
@@ -75,7 +75,7 @@ def create_bspline(obj_name: str, tab: BSplineTab) -> BSplineCurve:
     points = []
     for i, point in enumerate(tab.points_list):
         x, y, z = point
-        point = Point3D('Po' + str(i).zfill(3), x, y, z)
+        point = Vertex(x, y, z)
         points.append(point)
 
     return BSplineCurve(name=obj_name, control_points=points)
@@ -87,7 +87,7 @@ def create_3dobject(obj_name: str, tab: _3dObjectTab) -> Object3D:
 
     for i, point in enumerate(tab.points_list_3d):
         x, y, z = point
-        point = Point3D('Po' + str(i).zfill(3), x, y, z)
+        point = Vertex(x, y, z)
         points.append(point)
     
     faces = tab.faces_list_3d
@@ -100,7 +100,7 @@ def create_bicubicSurface(obj_name: str, tab: _BicubicTab) -> BicubicSurface:
 
     for i, point in enumerate(tab.points_list):
         x, y, z = point
-        point = Point3D('Po' + str(i).zfill(3), x, y, z)
+        point = Vertex(x, y, z)
         points.append(point)
 
     setup = BicubicSetup(points[0],points[1],points[2],points[3],points[4],points[5],points[6],
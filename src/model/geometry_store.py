@@ -0,0 +1,273 @@
+"""
+Packed storage for the geometry of every object in the display file
+"""
+from enum import Enum, auto
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from src.model.objects import (Vertex, Point3D, Line, Wireframe,
+                               BezierCurve, BezierCurveSetup, BSplineCurve,
+                               Object3D, BicubicSetup, BicubicSurface)
+
+
+class GeometryType(Enum):
+    '''Tag telling how a range of the vertex buffer maps back to an object'''
+    POINT = auto()
+    LINE = auto()
+    WIREFRAME = auto()
+    BEZIER = auto()
+    BSPLINE = auto()
+    OBJECT3D = auto()
+    BICUBIC = auto()
+
+
+class GeometryRange(NamedTuple):
+    '''Slice of the vertex buffer owned by one object'''
+    offset: int
+    length: int
+    type: GeometryType
+
+
+def geometry_type_of(obj) -> GeometryType:
+    '''Return the tag used to store an object'''
+    if isinstance(obj, Point3D):
+        return GeometryType.POINT
+
+    if isinstance(obj, Line):
+        return GeometryType.LINE
+
+    if isinstance(obj, Wireframe):
+        return GeometryType.WIREFRAME
+
+    if isinstance(obj, BezierCurve):
+        return GeometryType.BEZIER
+
+    if isinstance(obj, BSplineCurve):
+        return GeometryType.BSPLINE
+
+    if isinstance(obj, Object3D):
+        return GeometryType.OBJECT3D
+
+    if isinstance(obj, BicubicSurface):
+        return GeometryType.BICUBIC
+
+    raise TypeError(f'Invalid type for geometry store: {obj}')
+
+
+def object_points(obj, geometry_type: GeometryType) -> List[Vertex]:
+    '''Return, in storage order, the points that define an object'''
+    if geometry_type == GeometryType.POINT:
+        return [obj]
+
+    if geometry_type == GeometryType.LINE:
+        return [obj.p1, obj.p2]
+
+    if geometry_type == GeometryType.BEZIER:
+        points = []
+        for setup in obj.curves:
+            points.extend([setup.P1, setup.P2, setup.P3, setup.P4])
+        return points
+
+    if geometry_type == GeometryType.BSPLINE:
+        return obj.control_points
+
+    if geometry_type == GeometryType.BICUBIC:
+        return list(obj.setup)
+
+    # Wireframe and Object3D
+    return obj.points
+
+
+def build_object(obj, geometry_type: GeometryType, vertices: np.ndarray):
+    '''Return a copy of the object with its points read from vertices,
+    a (N, 3) or (N, 4) array in the same order as `object_points`'''
+    if geometry_type == GeometryType.POINT:
+        x, y, z = vertices[0, :3].tolist()
+        new_point = Point3D(obj.name, x, y, z, obj.thickness)
+        new_point.color = obj.color
+        return new_point
+
+    points = [Vertex(x, y, z) for x, y, z in vertices[:, :3].tolist()]
+
+    if geometry_type == GeometryType.LINE:
+        return obj.clone(p1=points[0], p2=points[1])
+
+    if geometry_type == GeometryType.BEZIER:
+        return obj.clone(curves=[
+            BezierCurveSetup(*points[i:i+4])
+            for i in range(0, len(points), 4)
+        ])
+
+    if geometry_type == GeometryType.BSPLINE:
+        return obj.clone(control_points=points)
+
+    if geometry_type == GeometryType.BICUBIC:
+        return obj.clone(setup=BicubicSetup(*points))
+
+    # Wireframe and Object3D
+    return obj.clone(points=points)
+
+
+class GeometryStore:
+    '''Keep the vertices of every object in one float64 array
+
+    Vertices are stored as homogeneous (x, y, z, 1) rows, so the whole scene
+    can go through `transform_array` in a single call. Each object owns a
+    contiguous range of rows, kept in the same order objects were added.
+    The world axis-aligned bounding box of each object is cached alongside.
+    '''
+
+    def __init__(self):
+        self._vertices: np.ndarray = np.ones((0, 4))
+        self._size: int = 0
+
+        self._objects: List = []
+        self._ranges: List[GeometryRange] = []
+        self._index: Dict[int, int] = {}
+        self._bounds: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    @property
+    def vertices(self) -> np.ndarray:
+        '''(N, 4) homogeneous vertices of the whole scene'''
+        return self._vertices[:self._size]
+
+    @property
+    def objects(self) -> List:
+        '''Stored objects, in insertion order'''
+        return list(self._objects)
+
+    @property
+    def ranges(self) -> List[GeometryRange]:
+        '''Vertex ranges of the stored objects, in insertion order'''
+        return list(self._ranges)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        '''(G, 2, 3) world min and max corners of the stored objects'''
+        return np.array(self._bounds).reshape(-1, 2, 3)
+
+    def bounds_of(self, vertices: np.ndarray) -> np.ndarray:
+        '''Return (G, 2, 3) min and max corners of every stored object in
+        vertices, an array aligned with `GeometryStore.vertices`'''
+        if not self._ranges:
+            return np.empty((0, 2, 3))
+
+        offsets = [offset for offset, _, _ in self._ranges]
+        points = vertices[:, :3]
+
+        return np.stack([np.minimum.reduceat(points, offsets),
+                         np.maximum.reduceat(points, offsets)], axis=1)
+
+    def index_of(self, obj) -> int:
+        '''Return the position of a stored object'''
+        return self._index[id(obj)]
+
+    def range_of(self, obj) -> GeometryRange:
+        '''Return the vertex range owned by a stored object'''
+        return self._ranges[self._index[id(obj)]]
+
+    def box_of(self, obj) -> np.ndarray:
+        '''Return the cached (2, 3) world bounds of a stored object'''
+        return self._bounds[self._index[id(obj)]]
+
+    def subset(self, indices: np.ndarray) -> 'GeometryStore':
+        '''Return a new store with only the objects at the given sorted
+        positions, their vertices copied in a single gather'''
+        store = GeometryStore()
+        ranges = [self._ranges[i] for i in indices.tolist()]
+        if not ranges:
+            return store
+
+        lengths = np.array([length for _, length, _ in ranges], dtype=int)
+        offsets = np.cumsum(lengths) - lengths
+        starts = np.array([offset for offset, _, _ in ranges], dtype=int)
+        rows = (np.arange(lengths.sum())
+                + np.repeat(starts - offsets, lengths))
+
+        store._vertices = self._vertices[rows]
+        store._size = len(rows)
+        store._objects = [self._objects[i] for i in indices.tolist()]
+        store._ranges = [
+            GeometryRange(offset, length, geometry_type)
+            for offset, (_, length, geometry_type)
+            in zip(offsets.tolist(), ranges)
+        ]
+        store._index = {id(obj): i for i, obj in enumerate(store._objects)}
+        store._bounds = [self._bounds[i] for i in indices.tolist()]
+
+        return store
+
+    def add(self, obj):
+        '''Append an object and its vertices to the store'''
+        geometry_type = geometry_type_of(obj)
+        vertices = self._pack(obj, geometry_type)
+
+        self._reserve(self._size + len(vertices))
+        self._vertices[self._size:self._size + len(vertices), :3] = vertices
+
+        self._index[id(obj)] = len(self._objects)
+        self._objects.append(obj)
+        self._ranges.append(
+            GeometryRange(self._size, len(vertices), geometry_type))
+        self._bounds.append(self._box(vertices))
+        self._size += len(vertices)
+
+    def replace(self, old_obj, new_obj):
+        '''Swap a stored object by another one, keeping its position'''
+        index = self._index.pop(id(old_obj))
+        offset, length, _ = self._ranges[index]
+
+        geometry_type = geometry_type_of(new_obj)
+        vertices = self._pack(new_obj, geometry_type)
+
+        if len(vertices) != length:
+            # Move every following range to fit the new vertex count
+            tail = self._vertices[offset + length:self._size].copy()
+            self._reserve(offset + len(vertices) + len(tail))
+            self._vertices[offset + len(vertices):
+                           offset + len(vertices) + len(tail)] = tail
+            self._size = offset + len(vertices) + len(tail)
+
+            shift = len(vertices) - length
+            for i in range(index + 1, len(self._ranges)):
+                self._ranges[i] = self._ranges[i]._replace(
+                    offset=self._ranges[i].offset + shift)
+
+        self._vertices[offset:offset + len(vertices), :3] = vertices
+
+        self._index[id(new_obj)] = index
+        self._objects[index] = new_obj
+        self._ranges[index] = GeometryRange(
+            offset, len(vertices), geometry_type)
+        self._bounds[index] = self._box(vertices)
+
+    def build_at(self, index: int, vertices: np.ndarray):
+        '''Rebuild the object at index with its points read from vertices,
+        an array aligned with `GeometryStore.vertices`'''
+        offset, length, geometry_type = self._ranges[index]
+        return build_object(self._objects[index], geometry_type,
+                            vertices[offset:offset + length])
+
+    def _pack(self, obj, geometry_type: GeometryType) -> np.ndarray:
+        '''Return object points as a (N, 3) array'''
+        points = object_points(obj, geometry_type)
+        return np.array([(p.x, p.y, p.z) for p in points],
+                        dtype=float).reshape(-1, 3)
+
+    def _box(self, vertices: np.ndarray) -> np.ndarray:
+        '''Return the (2, 3) min and max corners of packed vertices'''
+        return np.stack([vertices.min(axis=0), vertices.max(axis=0)])
+
+    def _reserve(self, size: int):
+        '''Grow the buffer, at least doubling it, to fit size vertices'''
+        if size <= len(self._vertices):
+            return
+
+        capacity = max(size, 2 * len(self._vertices), 64)
+        vertices = np.ones((capacity, 4))
+        vertices[:self._size] = self._vertices[:self._size]
+        self._vertices = vertices
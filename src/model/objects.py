@@ -1,8 +1,9 @@
 """
 File for modeling objects to be stored
 """
-from typing import List, NamedTuple, Tuple
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
 from math import isclose
+from copy import copy
 
 import numpy as np
 from PyQt5.QtGui import QColor
@@ -15,6 +16,18 @@ class BaseNamedColoredObject:
         self.color: QColor = color
         self.name: str = name
 
+    def clone(self, **geometry):
+        '''Return a shallow copy with the given geometry attributes replaced
+
+        Everything else, color and name included, is shared with the
+        original, so attributes must be replaced instead of mutated in place
+        '''
+        new_obj = copy(self)
+        for attribute, value in geometry.items():
+            setattr(new_obj, attribute, value)
+
+        return new_obj
+
     def as_list_of_tuples(self) -> List[Tuple[float, float, float]]:
         '''Return points as [(x, y, z)]'''
         raise NotImplementedError()
@@ -26,16 +39,47 @@ class BaseNamedColoredObject:
         raise NotImplementedError()
 
 
-class Point3D(BaseNamedColoredObject):
+class Vertex:
     """
-    Class for holding the three values with gettings/setters
+    Lightweight point, with no name nor color, for internal geometry
+
+    Used for the points that compose other objects and for intermediate
+    results (curve samples, clipped and transformed points), where a
+    Point3D would allocate a name and a QColor per instance
     """
+    __slots__ = ('x', 'y', 'z')
 
-    def __init__(self, name: str, x: float, y: float, z: float, thickness: int = 3):
-        super().__init__(name, QColor(0, 0, 0))
+    def __init__(self, x: float, y: float, z: float):
         self.x: float = x
         self.y: float = y
         self.z: float = z
+
+    def __repr__(self):
+        return f'({self.x} {self.y} {self.z})'
+
+    def as_tuple(self):
+        '''Return point as (x, y, x)'''
+        return (self.x, self.y, self.z)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Vertex):
+            return False
+
+        return all([isclose(other.x, self.x, abs_tol=1e-4),
+                    isclose(other.y, self.y, abs_tol=1e-4)])
+
+    def __ne__(self, other) -> bool:
+        return not self.__eq__(other)
+
+
+class Point3D(Vertex, BaseNamedColoredObject):
+    """
+    Class for holding the three values with gettings/setters
+    """
+
+    def __init__(self, name: str, x: float, y: float, z: float, thickness: int = 3):
+        BaseNamedColoredObject.__init__(self, name, QColor(0, 0, 0))
+        Vertex.__init__(self, x, y, z)
         self.thickness = thickness
 
     def __repr__(self):
@@ -55,34 +99,20 @@ class Point3D(BaseNamedColoredObject):
                 f'usemtl {self.color.name()[1:]}',
                 f'p {point_index}']
 
-    def as_tuple(self):
-        '''Return point as (x, y, x)'''
-        return (self.x, self.y, self.z)
-
-    def __eq__(self, other) -> bool:
-        if not isinstance(other, Point3D):
-            return False
-
-        return all([isclose(other.x, self.x, abs_tol=1e-4),
-                    isclose(other.y, self.y, abs_tol=1e-4)])
-
-    def __ne__(self, other) -> bool:
-        return not self.__eq__(other)
-
 
 class Line(BaseNamedColoredObject):
     """
     Class for holding the two points of a line
     """
 
-    def __init__(self, name: str, p1: Point3D, p2: Point3D, thickness: int = 3):
+    def __init__(self, name: str, p1: Vertex, p2: Vertex, thickness: int = 3):
         super().__init__(name, QColor(0, 0, 0))
-        self.p1: Point3D = p1
-        self.p2: Point3D = p2
+        self.p1: Vertex = p1
+        self.p2: Vertex = p2
         self.thickness = thickness
 
     @property
-    def points(self) -> List[Point3D]:
+    def points(self) -> List[Vertex]:
         '''Getter to get points from Line'''
         return [self.p1, self.p2]
 
@@ -105,12 +135,62 @@ class Line(BaseNamedColoredObject):
         return self.p1.__repr__() + ' -> ' + self.p2.__repr__()
 
 
+class LineSet(BaseNamedColoredObject):
+    """
+    Class for holding many disjoint lines sharing the same style
+    """
+
+    def __init__(self, name: str, segments: np.ndarray, thickness: int = 3):
+        super().__init__(name, QColor(0, 0, 0))
+        self.segments: np.ndarray = segments
+        self.thickness = thickness
+
+    def __repr__(self):
+        return f'LineSet({len(self.segments)} lines)'
+
+
+def polyline_lines(polylines: Sequence[np.ndarray], thickness: int,
+                   color: QColor,
+                   visible: Optional[Sequence[np.ndarray]] = None,
+                   name: str = '__') -> List[Line]:
+    '''Connect consecutive samples of (K, 3) polylines with lines, skipping
+    segments with an end not set in the matching (K,) visible masks'''
+    if len(polylines) == 0:
+        return []
+
+    starts = np.concatenate([polyline[:-1] for polyline in polylines])
+    ends = np.concatenate([polyline[1:] for polyline in polylines])
+
+    if visible is not None:
+        kept = np.concatenate([mask[:-1] & mask[1:] for mask in visible])
+        starts = starts[kept]
+        ends = ends[kept]
+
+    return segment_lines(np.stack([starts, ends], axis=1), thickness, color,
+                         name)
+
+
+def segment_lines(segments: np.ndarray, thickness: int,
+                  color: QColor, name: str = '__') -> List[Line]:
+    '''Create a line for each of the (E, 2, 3) segment ends'''
+    lines = []
+    for (x1, y1, z1), (x2, y2, z2) in segments.tolist():
+        line = Line(name,
+                    p1=Vertex(x=x1, y=y1, z=z1),
+                    p2=Vertex(x=x2, y=y2, z=z2),
+                    thickness=thickness)
+        line.color = color
+        lines.append(line)
+
+    return lines
+
+
 class Wireframe(BaseNamedColoredObject):
     """
     Class to hold polygons
     """
 
-    def __init__(self, name: str, points: List[Point3D], thickness: int = 3):
+    def __init__(self, name: str, points: List[Vertex], thickness: int = 3):
         super().__init__(name, QColor(0, 0, 0))
         self.points = self.points_clockwise(points)
         self.thickness = thickness
@@ -141,7 +221,7 @@ class Wireframe(BaseNamedColoredObject):
 
         yield Line(name='__', p1=self.points[-1], p2=self.points[0])
 
-    def points_clockwise(self, points: List[Point3D]) -> List[Point3D]:
+    def points_clockwise(self, points: List[Vertex]) -> List[Vertex]:
         '''Return the points in a clockwise sequence'''
         edges_calc = 0
         for i, p2 in enumerate(points, 1):
@@ -162,13 +242,135 @@ class Wireframe(BaseNamedColoredObject):
 
 class BezierCurveSetup(NamedTuple):
     '''Setup to create a Bezier blending function'''
-    P1: Point3D
-    P2: Point3D
-    P3: Point3D
-    P4: Point3D
+    P1: Vertex
+    P2: Vertex
+    P3: Vertex
+    P4: Vertex
+
+
+def flatten_bezier_segments(segments: np.ndarray, tolerance: float,
+                            max_depth: int = 16) -> List[np.ndarray]:
+    '''Subdivide (N, 4, 3) cubic Bezier control points with de Casteljau
+    until each piece is within tolerance of its chord, returning one (K, 3)
+    polyline for each segment
+
+    All pieces of a subdivision level are tested and split together.
+    '''
+    pieces = segments
+    owners = np.arange(len(segments))
+    starts = np.zeros(len(segments))
+    size = 1.0
+
+    flat_pieces, flat_owners, flat_starts = [], [], []
+    for depth in range(max_depth + 1):
+        if len(pieces) == 0:
+            break
+
+        # The curve lies in the hull of its control points, so the distance
+        # of the inner ones to the chord segment bounds the distance of the
+        # curve to it. Points overshooting the chord ends are measured to
+        # the nearest end, not to the line through it
+        chord = pieces[:, 3] - pieces[:, 0]
+        inner = pieces[:, 1:3] - pieces[:, None, 0]
+        chord_squared = np.einsum('ij,ij->i', chord, chord)
+        along = np.clip(
+            np.einsum('ikj,ij->ik', inner, chord)
+            / np.maximum(chord_squared, 1e-24)[:, None], 0, 1)
+        distance = np.linalg.norm(
+            inner - along[:, :, None] * chord[:, None], axis=2)
+
+        flat = distance.max(axis=1) <= tolerance
+        if depth == max_depth:
+            flat[:] = True
+
+        flat_pieces.append(pieces[flat])
+        flat_owners.append(owners[flat])
+        flat_starts.append(starts[flat])
+
+        p0, p1, p2, p3 = np.moveaxis(pieces[~flat], 1, 0)
+        p01, p12, p23 = (p0 + p1) / 2, (p1 + p2) / 2, (p2 + p3) / 2
+        p012, p123 = (p01 + p12) / 2, (p12 + p23) / 2
+        middle = (p012 + p123) / 2
+
+        size /= 2
+        pieces = np.concatenate([np.stack([p0, p01, p012, middle], axis=1),
+                                 np.stack([middle, p123, p23, p3], axis=1)])
+        owners = np.tile(owners[~flat], 2)
+        starts = np.concatenate([starts[~flat], starts[~flat] + size])
+
+    pieces = np.concatenate(flat_pieces)
+    owners = np.concatenate(flat_owners)
+    order = np.lexsort((np.concatenate(flat_starts), owners))
+    pieces = pieces[order]
+
+    # Each polyline is the start of its first piece plus every piece end
+    counts = np.bincount(owners, minlength=len(segments))
+    firsts = np.cumsum(counts) - counts
+
+    return [
+        np.concatenate([pieces[first, :1, :], pieces[first:first + count, 3]])
+        for first, count in zip(firsts.tolist(), counts.tolist())
+    ]
+
+
+class BaseTessellatedObject(BaseNamedColoredObject):
+    '''Base class for objects drawn from samples of their control points
+
+    Tessellations are kept by key along with the control points they came
+    from. Setting the control points evicts every cached tessellation.
+    '''
+
+    def __init__(self, name: str, color: QColor):
+        super().__init__(name, color)
+        self._tessellations: Dict[Hashable, Tuple[bytes, object]] = {}
+
+    def control_points_array(self) -> np.ndarray:
+        '''Return the control points as a (N, 3) array'''
+        raise NotImplementedError()
+
+    def _cached(self, key: Hashable, tessellate: Callable):
+        '''Return the tessellation stored by key, computing it again if
+        missing or made for other control points'''
+        content = self.control_points_array().tobytes()
+        cached = self._tessellations.get(key)
+
+        if cached is None or cached[0] != content:
+            samples = tessellate()
+            for array in samples:
+                array.setflags(write=False)
+            cached = (content, samples)
+            self._tessellations[key] = cached
+
+        return cached[1]
+
+    def _evict_tessellations(self):
+        '''Drop cached tessellations, without touching the ones shared
+        with clones of this object'''
+        self._tessellations = {}
+
 
+class BaseCurve(BaseTessellatedObject):
+    '''Base class for curves, caching their tessellations
 
-class BezierCurve(BaseNamedColoredObject):
+    A tessellation is a sequence of (K, 3) polylines of world samples, kept
+    by flatness tolerance.
+    '''
+
+    def bezier_segments(self) -> np.ndarray:
+        '''Return the curve as (N, 4, 3) cubic Bezier control points'''
+        raise NotImplementedError()
+
+    def flat_polylines(self, tolerance: float) -> List[np.ndarray]:
+        '''Return the curve adaptively subdivided until it is within
+        tolerance of its polylines, from cache when its control points did
+        not change'''
+        return self._cached(
+            ('tolerance', tolerance),
+            lambda: flatten_bezier_segments(self.bezier_segments(),
+                                            tolerance))
+
+
+class BezierCurve(BaseCurve):
     '''Class to hold points used to calculate a Bezier curve'''
 
     def __init__(self, name: str, curve_setups: List[BezierCurveSetup],
@@ -177,50 +379,24 @@ class BezierCurve(BaseNamedColoredObject):
         self.curves = curve_setups
         self.thickness = thickness
 
-    def calculate_lines(self, alpha: float):
-        '''Create a line with function at every alpha step'''
-        lines_to_return = []
-        for curve_setup in self.curves:
-            lines_to_return.extend(
-                self._calculate_for_setup(curve_setup, alpha))
-
-        return lines_to_return
-
-    def _calculate_for_setup(self, setup: BezierCurveSetup, step: float) -> List[Line]:
-        '''Calculate lines for this part os line segment'''
-        MB = np.array([[-1,  3, -3,  1],
-                       [3, -6,  3,  0],
-                       [-3,  3,  0,  0],
-                       [1,  0,  0,  0]])
-        GB = np.array([[setup.P1.x, setup.P1.y],
-                       [setup.P2.x, setup.P2.y],
-                       [setup.P3.x, setup.P3.y],
-                       [setup.P4.x, setup.P4.y]])
-
-        lines: List[Line] = []
-        t_values = list(np.arange(0, 1, step)) + [1]
-        p_start = t_values[0]
-        T0 = self._t_vec(p_start)
-        for i, p_end in enumerate(t_values, 1):
-            T1 = self._t_vec(p_end)
-
-            start_x, start_y = T0.dot(MB).dot(GB)
-            end_x, end_y = T1.dot(MB).dot(GB)
-
-            line = Line(
-                name='__l',
-                p1=Point3D('__p', x=start_x, y=start_y, z=0),
-                p2=Point3D('__p', x=end_x, y=end_y, z=0),
-                thickness=self.thickness
-            )
-            line.color = self.color
+    @property
+    def curves(self) -> List[BezierCurveSetup]:
+        '''Setups of the curve segments'''
+        return self._curves
 
-            lines.append(line)
+    @curves.setter
+    def curves(self, curve_setups: List[BezierCurveSetup]):
+        self._curves = curve_setups
+        self._evict_tessellations()
 
-            T0 = T1
-            p_start = p_end
+    def control_points_array(self) -> np.ndarray:
+        '''Return the points of every setup as a (4S, 3) array'''
+        return np.array([p.as_tuple() for setup in self.curves
+                         for p in setup], dtype=float).reshape(-1, 3)
 
-        return lines
+    def bezier_segments(self) -> np.ndarray:
+        '''Return the setups as (S, 4, 3) control points'''
+        return self.control_points_array().reshape(-1, 4, 3)
 
     def as_list_of_tuples(self):
         '''Return points from curve as list of tuples'''
@@ -235,21 +411,6 @@ class BezierCurve(BaseNamedColoredObject):
 
         return tuples
 
-    def _t_vec(self, t_value: float) -> np.ndarray:
-        '''Calcualte the T vector for points
-
-        Parameters
-        ----------
-        t: float
-            0 <= t <= 1
-        '''
-        values = [1, t_value]
-        for i in range(1, 3):
-            values.append(values[i] * t_value)
-
-        values.reverse()
-        return np.array(values)
-
     def describe_export_with(self, points: List[Tuple[float, float, float]],
                              colors: List[QColor]) -> List[str]:
         '''Return lines that describe object in .obj file, using indexes
@@ -262,17 +423,40 @@ class BezierCurve(BaseNamedColoredObject):
                 f'curv2 {" ".join(indexes)}']
 
 
-class BSplineCurve(BaseNamedColoredObject):
+class BSplineCurve(BaseCurve):
     '''BSpline object descriptor'''
 
-    def __init__(self, name: str, control_points: List[Point3D], thickness: int = 3):
+    def __init__(self, name: str, control_points: List[Vertex], thickness: int = 3):
         if len(control_points) < 4:
             raise ValueError('BSpline needs at least 4 points')
         super().__init__(name, QColor(0, 0, 0))
         self.thickness = thickness
 
         self.control_points = control_points
-        self.line_as_points = self.calculate_lines(0.1)
+
+    @property
+    def control_points(self) -> List[Vertex]:
+        '''Points controlling the curve'''
+        return self._control_points
+
+    @control_points.setter
+    def control_points(self, control_points: List[Vertex]):
+        self._control_points = control_points
+        self._evict_tessellations()
+
+    @property
+    def points(self) -> List[Vertex]:
+        '''Alias of control points, as used by transformations'''
+        return self.control_points
+
+    @points.setter
+    def points(self, points: List[Vertex]):
+        self.control_points = points
+
+    def control_points_array(self) -> np.ndarray:
+        '''Return the control points as a (N, 3) array'''
+        return np.array([p.as_tuple() for p in self.control_points],
+                        dtype=float).reshape(-1, 3)
 
     def as_list_of_tuples(self) -> List[Tuple[int, int, int]]:
         '''Return points as list of tuples'''
@@ -288,67 +472,21 @@ class BSplineCurve(BaseNamedColoredObject):
 
         return tuples
 
-    def _e_coef(self, delta: float) -> np.array:
-        '''Generate the E matrix for calculating curve plot'''
-        return np.array([
-            [0, 0, 0, 1],
-            [delta**3, delta**2, delta, 0],
-            [6*delta**3, 2*delta**2, 0, 0],
-            [6*delta**3, 0, 0, 0]
-        ])
-
-    def calc_curve_points(self, steps: int, points: np.array, E: np.array, Mbs: np.array):
-        '''Calculate points for curve'''
-        coefs = Mbs.dot(points)
-        diffs = E.dot(coefs)
-        x, y = diffs[0]
-        dx, dy = diffs[1]
-        dx2, dy2 = diffs[2]
-        dx3, dy3 = diffs[3]
-
-        curve_points = [(x, y)]
-        for i in range(steps):
-            x += dx
-            y += dy
-            curve_points.append((x, y))
-
-            dx += dx2
-            dy += dy2
-            dx2 += dx3
-            dy2 += dy3
-
-        return np.array(curve_points)
-
-    def calculate_lines(self, delta: float) -> List[Line]:
-        '''Plot the curve to lines'''
-        Mbs = np.array([[-1, 3, -3, 1],
-                        [3, -6, 3, 0],
-                        [-3, 0, 3, 0],
-                        [1, 4, 1, 0]])
-        Mbs = Mbs / 6
-
-        G = np.array([[p.x, p.y] for p in self.control_points])
-        E = self._e_coef(delta)
-        steps = int(1/delta)
-        points = []
-        for i in range(3, len(G)):
-            base_points = G[i-3: i+1]
-            points.extend(self.calc_curve_points(steps, base_points, E, Mbs))
-
-        points3d = [
-            Point3D('_p', x=p[0], y=p[1], z=0)
-            for p in points
-        ]
-        lines = []
-        for i, point in enumerate(points3d[:-1]):
-            line = Line('__',
-                        p1=point,
-                        p2=points3d[i+1],
-                        thickness=self.thickness)
-            line.color = self.color
-            lines.append(line)
-
-        return lines
+    def windows(self) -> np.ndarray:
+        '''Return every 4 consecutive control points as (W, 4, 3)'''
+        G = self.control_points_array()
+        return G[np.arange(len(G) - 3)[:, None] + np.arange(4)]
+
+    def bezier_segments(self) -> np.ndarray:
+        '''Return each 4 points window as (W, 4, 3) Bezier control points
+        of the same curve piece'''
+        # Change of basis, from B-Spline to Bezier control points
+        bspline_to_bezier = np.array([[1, 4, 1, 0],
+                                      [0, 4, 2, 0],
+                                      [0, 2, 4, 0],
+                                      [0, 1, 4, 1]]) / 6
+
+        return bspline_to_bezier @ self.windows()
 
     def describe_export_with(self, points: List[Tuple[float, float, float]],
                              colors: List[QColor]) -> List[str]:
@@ -368,7 +506,7 @@ class BSplineCurve(BaseNamedColoredObject):
 class Object3D(BaseNamedColoredObject):
     '''Object composed by 3D Points and faces'''
 
-    def __init__(self, name: str, points: List[Point3D],
+    def __init__(self, name: str, points: List[Vertex],
                  faces: List[List[int]], thickness: int = 3):
         super().__init__(name, QColor(0, 0, 0))
         self.thickness = thickness
@@ -376,6 +514,122 @@ class Object3D(BaseNamedColoredObject):
         self.faces = faces
         self.points = points
 
+    @property
+    def points(self) -> List[Vertex]:
+        '''Points of the object, indexed by faces'''
+        return self._points
+
+    @points.setter
+    def points(self, points: List[Vertex]):
+        self._points = points
+
+        # Normals follow the points, they are computed again once the
+        # object is transformed
+        self._face_normals: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def faces(self) -> List[List[int]]:
+        '''Faces, as lists of 1 based indexes into points'''
+        return self._faces
+
+    @faces.setter
+    def faces(self, faces: List[List[int]]):
+        self._faces = faces
+
+        # Index arrays only depend on faces, so transformed copies share them
+        self._face_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # Unique edges and the edge of each face corner, set together
+        self._edge_topology: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._face_normals = None
+
+    def face_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Return every face packed as 0 based point indexes, and the
+        (F + 1,) offsets where each face starts and ends in them'''
+        if self._face_arrays is None:
+            lengths = [len(face) for face in self.faces]
+            indexes = np.fromiter(
+                (index for face in self.faces for index in face),
+                dtype=int, count=sum(lengths)) - 1
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+            self._face_arrays = (indexes, offsets)
+
+        return self._face_arrays
+
+    def _following_corners(self) -> np.ndarray:
+        '''Return, for each packed face corner, the position of the next
+        corner of its face, the last one going back to the first'''
+        indexes, offsets = self.face_arrays()
+
+        following = np.arange(1, len(indexes) + 1)
+        following[offsets[1:] - 1] = offsets[:-1]
+
+        return following
+
+    def unique_edges(self) -> np.ndarray:
+        '''Return the (E, 2) point indexes of the face edges, each edge
+        shared by many faces only once'''
+        return self._unique_edge_topology()[0]
+
+    def _unique_edge_topology(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Return the unique edges and, for each packed face corner, the
+        index of the edge going from it to the next corner'''
+        if self._edge_topology is None:
+            indexes, _ = self.face_arrays()
+
+            # Each point goes to the next of its face
+            edges = np.sort(np.stack(
+                [indexes, indexes[self._following_corners()]], axis=1), axis=1)
+            unique_edges, edge_of_corner = np.unique(
+                edges, axis=0, return_inverse=True)
+            self._edge_topology = (unique_edges, edge_of_corner.reshape(-1))
+
+        return self._edge_topology
+
+    def edges_of_faces(self, face_mask: np.ndarray) -> np.ndarray:
+        '''Return a (E,) mask of the unique edges in at least one of the
+        faces set in face_mask'''
+        edges, edge_of_corner = self._unique_edge_topology()
+        _, offsets = self.face_arrays()
+
+        corner_mask = np.repeat(face_mask, np.diff(offsets))
+        edge_mask = np.zeros(len(edges), dtype=bool)
+        edge_mask[edge_of_corner[corner_mask]] = True
+
+        return edge_mask
+
+    def face_normals(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Return the (F, 3) world normals of the faces, by Newell's method,
+        and the (F, 3) first point of each face'''
+        if self._face_normals is None:
+            indexes, offsets = self.face_arrays()
+            points = np.array([(p.x, p.y, p.z) for p in self.points],
+                              dtype=float).reshape(-1, 3)
+
+            current = points[indexes]
+            following = current[self._following_corners()]
+
+            # Sum over each face of the cross products of its sides
+            products = np.cross(current, following)
+            normals = np.add.reduceat(products, offsets[:-1], axis=0)
+
+            self._face_normals = (normals, current[offsets[:-1]])
+
+        return self._face_normals
+
+    def front_faces(self, eye: np.ndarray) -> np.ndarray:
+        '''Return a (F,) mask of the faces turned to eye, a homogeneous
+        (4,) point, with w 0 for a viewer at infinity'''
+        normals, anchors = self.face_normals()
+        towards_eye = eye[:3] - eye[3] * anchors
+
+        # Faces seen edge on, up to rounding, or without area are kept
+        facing = np.einsum('ij,ij->i', normals, towards_eye)
+        scale = (np.linalg.norm(normals, axis=1)
+                 * np.linalg.norm(towards_eye, axis=1))
+
+        return facing >= -1e-9 * scale
+
     def get_wireframes(self) -> List[Wireframe]:
         '''Connect the points for each face and return list of wireframes'''
         wireframes = []
@@ -418,24 +672,53 @@ class Object3D(BaseNamedColoredObject):
 
 class BicubicSetup(NamedTuple):
     '''Setup to create a Bezier blending function'''
-    P1: Point3D
-    P2: Point3D
-    P3: Point3D
-    P4: Point3D
-    P5: Point3D
-    P6: Point3D
-    P7: Point3D
-    P8: Point3D
-    P9: Point3D
-    P10: Point3D
-    P11: Point3D
-    P12: Point3D
-    P13: Point3D
-    P14: Point3D
-    P15: Point3D
-    P16: Point3D
-
-class BicubicSurface(BaseNamedColoredObject):
+    P1: Vertex
+    P2: Vertex
+    P3: Vertex
+    P4: Vertex
+    P5: Vertex
+    P6: Vertex
+    P7: Vertex
+    P8: Vertex
+    P9: Vertex
+    P10: Vertex
+    P11: Vertex
+    P12: Vertex
+    P13: Vertex
+    P14: Vertex
+    P15: Vertex
+    P16: Vertex
+
+def bicubic_grid(geometry: np.ndarray, s_values: np.ndarray,
+                 t_values: np.ndarray) -> np.ndarray:
+    '''Evaluate S·M·G·Mᵀ·Tᵀ for every (s, t) pair at once
+
+    geometry holds (..., 4, 4, 3) geometry matrices, so many patches can be
+    evaluated together, and the result is a (..., ns, nt, 3) grid.
+    '''
+    M = np.array([[-1, 3, -3, 1],
+                  [3, -6, 3, 0],
+                  [-3, 3, 0, 0],
+                  [1, 0, 0, 0]])
+    S = s_values[:, None] ** np.arange(3, -1, -1)
+    T = t_values[:, None] ** np.arange(3, -1, -1)
+
+    return np.einsum('si,ij,...jkc,lk,tl->...stc', S, M, geometry, M, T,
+                     optimize=True)
+
+
+def grid_edges(ns: int, nt: int) -> np.ndarray:
+    '''Return (E, 2) indexes, into a flattened (ns, nt) grid, of the edges
+    of every s-curve and every t-curve of the grid'''
+    index = np.arange(ns * nt).reshape(ns, nt)
+
+    along_t = np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1)
+    along_s = np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1)
+
+    return np.concatenate([along_t, along_s])
+
+
+class BicubicSurface(BaseTessellatedObject):
     '''Surface composed by cubic curves'''
 
     def __init__(self, name: str, setup: BicubicSetup,
@@ -444,73 +727,62 @@ class BicubicSurface(BaseNamedColoredObject):
         self.thickness = thickness
 
         self.setup = setup
-        self.points = self.calc_superficie(0.1,0.1)
-    
-    def create_matrices(self):
-        setup = self.setup
-        gbx = []
-        gby = []
-        gbz = []
-        for p in range(0,15,4):
-            p1 = setup[p]
-            p2 = setup[p+1]
-            p3 = setup[p+2]
-            p4 = setup[p+3]
-
-            gbx.append([p1.x,p2.x,p3.x,p4.x])
-            gby.append([p1.y,p2.y,p3.y,p4.y])
-            gbz.append([p1.z,p2.z,p3.z,p4.z])
-        
-        return gbx,gby,gbz
-    
-    def matrix_s(self, s):
-        return np.array([s**3, s**2, s, 1])
-    
-    def matrix_t(self,t):
-        return np.array([t**3, t**2, t, 1])
-    
-    def calc_x(self, s1,t1,mb,gbx):
-        return (((self.matrix_s(s1).dot(mb)).dot(gbx)).dot((np.transpose(mb)))).dot((np.transpose(self.matrix_t(t1))))
-    
-    def calc_y(self, s1,t1,mb,gby):
-        return (((self.matrix_s(s1).dot(mb)).dot(gby)).dot((np.transpose(mb)))).dot((np.transpose(self.matrix_t(t1))))
-    
-    def calc_z(self, s1,t1,mb,gbz):
-        return (((self.matrix_s(s1).dot(mb)).dot(gbz)).dot((np.transpose(mb)))).dot((np.transpose(self.matrix_t(t1))))
-    
-    def calc_superficie(self, s,t):
-        mb =  [[-1,3,-3,1], [3,-6,3,0],[-3,3,0,0],[1,0,0,0]]
-        gbx, gby, gbz = self.create_matrices()
-        points = []
-        xss = []
-        yss = []
-        zss = []
-
-        for i in np.arange(0,1,s):
-            for r in np.arange(0,1,t):
-                x1 = self.calc_x(i,r, mb, gbx)
-                xss.append(x1)
-                y1 = self.calc_y(i,r, mb, gby)
-                yss.append(y1)
-                z1 = self.calc_z(i,r, mb, gbz)
-                zss.append(z1)
-                p = Point3D('__', x1,y1,z1)
-                points.append(p)
-
-        return points #, xss, yss, zss
-    
-    def get_lines(self) -> List[Line]:
-        '''Connect the points for each face and return one wireframe'''
-        lines = []
-        points = self.points
-        len(points)
 
-        for i in range(0,14):
-            line = Line("_", points[i], points[i+1])
-            line.color = self.color
-            lines.append(line)
-        
-        return lines
+    @property
+    def setup(self) -> BicubicSetup:
+        '''The 16 points controlling the surface'''
+        return self._setup
+
+    @setup.setter
+    def setup(self, setup: BicubicSetup):
+        self._setup = setup
+        self._evict_tessellations()
+
+    @property
+    def points(self) -> List[Vertex]:
+        '''Alias of setup points, as used by transformations'''
+        return list(self.setup)
+
+    @points.setter
+    def points(self, points: List[Vertex]):
+        self.setup = BicubicSetup(*points)
+
+    def control_points_array(self) -> np.ndarray:
+        '''Return the setup points as a (16, 3) array'''
+        return self.geometry_matrix().reshape(-1, 3)
+
+    def mesh(self, ns: int, nt: int) -> Tuple[np.ndarray, np.ndarray]:
+        '''Return the (ns * nt, 3) grid vertices and the (E, 2) indexes of
+        its s-curve and t-curve edges, from cache when the setup points did
+        not change'''
+        return self._cached(
+            ('mesh', ns, nt),
+            lambda: (self.surface_grid(ns, nt).reshape(-1, 3),
+                     grid_edges(ns, nt)))
+
+    def geometry_matrix(self) -> np.ndarray:
+        '''Return the 16 setup points as a (4, 4, 3) geometry matrix'''
+        return np.array([p.as_tuple() for p in self.setup],
+                        dtype=float).reshape(4, 4, 3)
+
+    def surface_grid(self, ns: int, nt: int) -> np.ndarray:
+        '''Return the surface sampled at ns values of s and nt values of t,
+        both from 0 to 1, as a (ns, nt, 3) grid'''
+        return bicubic_grid(self.geometry_matrix(),
+                            np.linspace(0, 1, ns), np.linspace(0, 1, nt))
+
+    def calc_superficie(self, s, t):
+        '''Return surface points every s and t step, with s and t < 1'''
+        grid = bicubic_grid(self.geometry_matrix(),
+                            np.arange(0, 1, s), np.arange(0, 1, t))
+
+        return [Vertex(x, y, z) for x, y, z in grid.reshape(-1, 3).tolist()]
+    
+    def get_lines(self, ns: int = 10, nt: int = 10) -> List[Line]:
+        '''Return the lines of every s-curve and t-curve of a ns x nt grid
+        '''
+        vertices, edges = self.mesh(ns, nt)
+        return segment_lines(vertices[edges], self.thickness, self.color)
 
 
 
@@ -518,6 +790,8 @@ class BicubicSurface(BaseNamedColoredObject):
 class ViewportObjectRepresentation(NamedTuple):
     '''Class to hold data of a object ready to be draw at viewport'''
     name: str
-    points: List[Point3D]
+    points: List[Vertex]
     color: QColor
     thickness: int
+    # (E, 4) x1, y1, x2, y2 rows, set instead of points for line sets
+    segments: Optional[np.ndarray] = None
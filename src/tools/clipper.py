@@ -1,11 +1,12 @@
 '''Clipper class'''
 from enum import Enum, auto
-from copy import deepcopy
 from dataclasses import dataclass
 from typing import List, Union, Tuple, Optional
 from math import isclose
 
-from src.model.objects import Point3D, Line, Wireframe, BicubicSurface
+import numpy as np
+
+from src.model.objects import Vertex, Point3D, Line, LineSet, Wireframe
 
 
 @dataclass
@@ -24,6 +25,12 @@ class ClipperSetup:
     ymin: float
 
 
+class PolygonClippingMode(Enum):
+    '''Algorithm used by the clipper for wireframes'''
+    WEILER_ATHERTON = auto()
+    SUTHERLAND_HODGMAN = auto()
+
+
 def close_to_zero(num: float) -> bool:
     '''Centralzie comparisons with zero for this module'''
     return isclose(num, 0, abs_tol=1e-6)
@@ -53,10 +60,14 @@ def remove_items_in_between(lst: List, start, end) -> List:
 class Clipper:
     '''Centralize clipping processess'''
 
-    def __init__(self, setup: ClipperSetup):
+    def __init__(self, setup: ClipperSetup,
+                 polygon_mode: PolygonClippingMode =
+                 PolygonClippingMode.WEILER_ATHERTON):
         '''Receive the setup with needed information for clipping algorithms
+        and the algorithm to be used with wireframes
         '''
         self.setup = setup
+        self.polygon_mode = polygon_mode
 
     def clip_objects(self, objects: List[Union[Point3D, Line, Wireframe]]
                      ) -> List[Union[Point3D, Line, Wireframe]]:
@@ -65,6 +76,13 @@ class Clipper:
         '''
 
         cliped_objects: List[Union[Point3D, Line, Wireframe]] = []
+
+        # Every line is clipped at once, results are taken in order below
+        clipped_lines = iter(self._clip_lines(
+            [obj for obj in objects if isinstance(obj, Line)]))
+        clipped_wireframes = iter(self._clip_wireframes(
+            [obj for obj in objects if isinstance(obj, Wireframe)]))
+
         # print('objects to be clipped')
         # print(objects)
         for obj in objects:
@@ -77,12 +95,12 @@ class Clipper:
                     cliped_objects.append(new_obj)
 
             elif isinstance(obj, Line):
-                inside_window, new_obj = self._clip_line(obj)
-                if inside_window and obj.p1.z > -1e-4 and obj.p2.z > -1e-4:
+                new_obj = next(clipped_lines)
+                if new_obj is not None:
                     cliped_objects.append(new_obj)
 
             elif isinstance(obj, Wireframe):
-                inside_window, new_objs = self._clip_wireframe(obj)
+                inside_window, new_objs = next(clipped_wireframes)
                 # print(inside_window)
                 # print(new_objs)
                 # print(obj.points)
@@ -91,11 +109,38 @@ class Clipper:
                     # print('inside is')
                     cliped_objects.extend(new_objs)
 
+            elif isinstance(obj, LineSet):
+                new_obj = self._clip_line_set(obj)
+                if len(new_obj.segments):
+                    cliped_objects.append(new_obj)
+
             else:
                 raise ValueError(f'Clipping not implemented for `{obj}`')
 
         return cliped_objects
 
+    def classify_bounds(self, bounds: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+        '''Trivially accept or reject (N, 2, 3) bounding boxes, returning
+        masks for the boxes fully inside and fully outside the setup'''
+        low = bounds[:, 0]
+        high = bounds[:, 1]
+
+        # Depth follows the per object test done by `clip_objects`
+        inside = ((low[:, 0] >= self.setup.xmin)
+                  & (high[:, 0] <= self.setup.xmax)
+                  & (low[:, 1] >= self.setup.ymin)
+                  & (high[:, 1] <= self.setup.ymax)
+                  & (low[:, 2] > -1e-4))
+
+        outside = ((high[:, 0] < self.setup.xmin)
+                   | (low[:, 0] > self.setup.xmax)
+                   | (high[:, 1] < self.setup.ymin)
+                   | (low[:, 1] > self.setup.ymax)
+                   | (high[:, 2] <= -1e-4))
+
+        return inside, outside
+
     def _clip_point(self, point: Point3D) -> Tuple[bool, Optional[Point3D]]:
         '''Clip a point based on clipper setup'''
         in_x_range = self.setup.xmin <= point.x <= self.setup.xmax
@@ -106,13 +151,54 @@ class Clipper:
 
         return False, None
 
-    def _clip_line(self, line: Line) -> Tuple[bool, Optional[Line]]:
-        '''Clip a line based on clipper setup'''
-        lb_clipper = LiangBarskyLineClipping(line, self.setup)
+    def clip_segments(self, segments: np.ndarray
+                      ) -> Tuple[np.ndarray, np.ndarray]:
+        '''Clip a (N, 2, 2) array of segment endpoints based on clipper
+        setup, returning the clipped endpoints and the accept mask'''
+        return LiangBarskyBatchLineClipping(segments, self.setup).get_clipped()
 
-        clipped = lb_clipper.get_clipped()
+    def _clip_lines(self, lines: List[Line]) -> List[Optional[Line]]:
+        '''Clip lines in a single batch, None for the rejected ones'''
+        if not lines:
+            return []
 
-        return clipped is not None, clipped
+        coordinates = np.array(
+            [(line.p1.x, line.p1.y, line.p1.z, line.p2.x, line.p2.y, line.p2.z)
+             for line in lines], dtype=float).reshape(-1, 2, 3)
+
+        clipped, accepted = self.clip_segments(coordinates[:, :, :2])
+        accepted &= (coordinates[:, :, 2] > -1e-4).all(axis=1)
+
+        return [
+            line.clone(p1=Vertex(x=x1, y=y1, z=0), p2=Vertex(x=x2, y=y2, z=0))
+            if is_accepted else None
+            for line, ((x1, y1), (x2, y2)), is_accepted
+            in zip(lines, clipped.tolist(), accepted.tolist())
+        ]
+
+    def _clip_line_set(self, line_set: LineSet) -> LineSet:
+        '''Clip all lines of the set at once, keeping the accepted ones'''
+        clipped, accepted = self.clip_segments(line_set.segments[:, :, :2])
+        accepted &= (line_set.segments[:, :, 2] > -1e-4).all(axis=1)
+
+        segments = np.zeros((int(accepted.sum()), 2, 3))
+        segments[:, :, :2] = clipped[accepted]
+
+        return line_set.clone(segments=segments)
+
+    def _clip_wireframes(self, wireframes: List[Wireframe]
+                         ) -> List[Tuple[bool, Optional[List[Wireframe]]]]:
+        '''Clip wireframes with the configured polygon algorithm'''
+        if self.polygon_mode == PolygonClippingMode.WEILER_ATHERTON:
+            return [self._clip_wireframe(wireframe)
+                    for wireframe in wireframes]
+
+        if self.polygon_mode == PolygonClippingMode.SUTHERLAND_HODGMAN:
+            sh_clipper = SutherlandHodgmanPolygonClipping(wireframes,
+                                                          self.setup)
+            return [(True, clipped) for clipped in sh_clipper.get_clipped()]
+
+        raise ValueError(f'Invalid polygon clipping mode: {self.polygon_mode}')
 
     def _clip_wireframe(self, wireframe: Wireframe
                         ) -> Tuple[bool, Optional[Line]]:
@@ -174,23 +260,146 @@ class LiangBarskyLineClipping:
         if u1 > u2:
             return None
 
-        new_line = deepcopy(self.line)
-
-        new_line.p1 = Point3D(
-            name='_p1',
-            x=self.line.p1.x + self.pq_list[1]['p'] * u1,
-            y=self.line.p1.y + self.pq_list[3]['p'] * u1,
-            z=0
+        return self.line.clone(
+            p1=Vertex(
+                x=self.line.p1.x + self.pq_list[1]['p'] * u1,
+                y=self.line.p1.y + self.pq_list[3]['p'] * u1,
+                z=0
+            ),
+            p2=Vertex(
+                x=self.line.p1.x + self.pq_list[1]['p'] * u2,
+                y=self.line.p1.y + self.pq_list[3]['p'] * u2,
+                z=0
+            )
         )
 
-        new_line.p2 = Point3D(
-            name='_p2',
-            x=self.line.p1.x + self.pq_list[1]['p'] * u2,
-            y=self.line.p1.y + self.pq_list[3]['p'] * u2,
-            z=0
-        )
 
-        return new_line
+class LiangBarskyBatchLineClipping:
+    '''Liang-Barsky computed with numpy over many segments at once'''
+
+    def __init__(self, segments: np.ndarray, clipper_setup: ClipperSetup):
+        '''Initialize values for equations, with segments as a (N, 2, 2)
+        array of [[x1, y1], [x2, y2]]'''
+        self.start = segments[:, 0]
+        self.delta = segments[:, 1] - segments[:, 0]
+
+        dx = self.delta[:, 0]
+        dy = self.delta[:, 1]
+        x1 = self.start[:, 0]
+        y1 = self.start[:, 1]
+
+        # Columns follow the left, right, bottom and top window edges
+        self.p = np.stack([-dx, dx, -dy, dy], axis=1)
+        self.q = np.stack([x1 - clipper_setup.xmin,
+                           clipper_setup.xmax - x1,
+                           y1 - clipper_setup.ymin,
+                           clipper_setup.ymax - y1], axis=1)
+
+        self.parallel = np.isclose(self.p, 0, rtol=0, atol=1e-6)
+        self.is_inside = ~(self.parallel & (self.q < 0)).any(axis=1)
+
+    def get_clipped(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Return the clipped (N, 2, 2) endpoints and a (N,) mask telling
+        which segments are inside the setup'''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = self.q / self.p
+
+        entering = ~self.parallel & (self.p < 0)
+        exiting = ~self.parallel & (self.p > 0)
+
+        u1 = np.where(entering, ratios, 0).max(axis=1, initial=0)
+        u2 = np.where(exiting, ratios, 1).min(axis=1, initial=1)
+
+        accepted = self.is_inside & (u1 <= u2)
+
+        clipped = np.stack([
+            self.start + self.delta * u1[:, None],
+            self.start + self.delta * u2[:, None]
+        ], axis=1)
+
+        return clipped, accepted
+
+
+class SutherlandHodgmanPolygonClipping:
+    '''Sutherland-Hodgman over many polygons at once
+
+    The vertices of every polygon are kept in one flattened (M, 3) array and
+    each window edge is applied to all of them in a single numpy pass, so a
+    frame costs four passes no matter how many faces it has. Polygons are
+    assumed to be clipped against a convex window, which is always the case
+    for the clipper setup.
+    '''
+
+    def __init__(self, wireframes: List[Wireframe], setup: ClipperSetup):
+        '''Flatten wireframe points and keep the polygon of each vertex'''
+        self.wireframes = wireframes
+
+        # Window edges as (axis, bound, side), inside is side*(v - bound) >= 0
+        self.window_edges = [
+            (0, setup.xmin, 1),
+            (0, setup.xmax, -1),
+            (1, setup.ymin, 1),
+            (1, setup.ymax, -1)
+        ]
+
+        lengths = np.array([len(w.points) for w in wireframes], dtype=int)
+        self.vertices = np.array(
+            [(p.x, p.y, p.z) for w in wireframes for p in w.points],
+            dtype=float).reshape(-1, 3)
+        self.groups = np.repeat(np.arange(len(wireframes)), lengths)
+
+    def clip_edge(self, vertices: np.ndarray, groups: np.ndarray,
+                  window_edge: Tuple[int, float, int]
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+        '''Clip every polygon against one window edge, returning the new
+        flattened vertices and the polygon of each of them'''
+        if len(vertices) == 0:
+            return vertices, groups
+
+        axis, bound, side = window_edge
+
+        # Previous vertex of each one, wrapping around inside its polygon
+        lengths = np.bincount(groups, minlength=len(self.wireframes))
+        starts = np.cumsum(lengths) - lengths
+        index = np.arange(len(vertices))
+        previous = index - 1
+        first = index == starts[groups]
+        previous[first] = index[first] + lengths[groups[first]] - 1
+
+        current_inside = side * (vertices[:, axis] - bound) >= 0
+        previous_inside = current_inside[previous]
+        crossing = current_inside != previous_inside
+
+        start = vertices[previous]
+        delta = vertices - start
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (bound - start[:, axis]) / delta[:, axis]
+            intersection = start + delta * ratio[:, None]
+        intersection[:, axis] = bound
+
+        # Each vertex emits the crossing point, then itself if inside
+        candidates = np.stack([intersection, vertices], axis=1).reshape(-1, 3)
+        emitted = np.stack([crossing, current_inside], axis=1)
+
+        return (candidates[emitted.ravel()],
+                np.repeat(groups, emitted.sum(axis=1)))
+
+    def get_clipped(self) -> List[List[Wireframe]]:
+        '''Apply the clipping algorithm, returning for each wireframe a list
+        with its clipped copy, or an empty list if it is outside'''
+        vertices, groups = self.vertices, self.groups
+        for window_edge in self.window_edges:
+            vertices, groups = self.clip_edge(vertices, groups, window_edge)
+
+        lengths = np.bincount(groups, minlength=len(self.wireframes))
+        polygons = np.split(vertices, np.cumsum(lengths)[:-1])
+
+        return [
+            [wireframe.clone(points=[Vertex(x, y, z)
+                                     for x, y, z in polygon.tolist()])]
+            if len(polygon) else []
+            for wireframe, polygon in zip(self.wireframes, polygons)
+        ]
 
 
 class _Type(Enum):
@@ -208,30 +417,28 @@ class WeilerAthertonPolygonClipping:
 
         self.wireframe = wireframe
 
-        self.top_left = Point3D('tl', x=setup.xmin, y=setup.ymax, z=0)
-        self.top_right = Point3D('tr', x=setup.xmax, y=setup.xmax, z=0)
-        self.bot_right = Point3D('br', x=setup.xmax, y=setup.ymin, z=0)
-        self.bot_left = Point3D('bl', x=setup.xmin, y=setup.ymin, z=0)
+        self.top_left = Vertex(x=setup.xmin, y=setup.ymax, z=0)
+        self.top_right = Vertex(x=setup.xmax, y=setup.xmax, z=0)
+        self.bot_right = Vertex(x=setup.xmax, y=setup.ymin, z=0)
+        self.bot_left = Vertex(x=setup.xmin, y=setup.ymin, z=0)
 
-    def point_inside_window(self, point: Point3D) -> bool:
+    def point_inside_window(self, point: Vertex) -> bool:
         '''Check if point is inside window received a setup'''
         inside_x_range = self.setup.xmin <= point.x <= self.setup.xmax
         inside_y_range = self.setup.ymin <= point.y <= self.setup.ymax
 
         return inside_x_range and inside_y_range
 
-    def copy_wireframe(self, points: Optional[List[Point3D]] = None) -> Wireframe:
+    def copy_wireframe(self, points: Optional[List[Vertex]] = None) -> Wireframe:
         '''Return copy of internal object, optionally setting its point'''
         if points is None:
-            return deepcopy(self.wireframe)
+            return self.wireframe.clone()
 
-        nwf = deepcopy(self.wireframe)
-        nwf.points = points
-        return nwf
+        return self.wireframe.clone(points=points)
 
-    def insert_into_edges(self, edges: List[Tuple[Point3D, _Type]],
-                          new_pt: Tuple[Point3D, _Type]
-                          ) -> List[Tuple[Point3D, _Type]]:
+    def insert_into_edges(self, edges: List[Tuple[Vertex, _Type]],
+                          new_pt: Tuple[Vertex, _Type]
+                          ) -> List[Tuple[Vertex, _Type]]:
         '''Insert the point into edges list based on what edge
         line the point is from, considering a clockwise path'''
         point = new_pt[0]
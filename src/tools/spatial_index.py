@@ -0,0 +1,107 @@
+'''Spatial index over the world bounds of display file objects'''
+from itertools import compress, product
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.tools.clipper import Clipper
+
+
+# Corners of the unit cube, used to get the 8 corners of a cell
+_CUBE_CORNERS = np.array(list(product((0, 1), repeat=3)), dtype=float)
+
+
+class UniformGrid:
+    '''Uniform grid over world axis-aligned bounding boxes
+
+    Each object is registered, by its index in the geometry store, in every
+    cell its box touches. Objects spanning more than `max_cells_per_object`
+    cells are kept apart and returned by every query.
+    '''
+
+    def __init__(self, cell_size: float = 500,
+                 max_cells_per_object: int = 512):
+        '''Receive the edge length of the cubic cells, in world units'''
+        self.cell_size = cell_size
+        self.max_cells_per_object = max_cells_per_object
+
+        self._cells: Dict[Tuple[int, int, int], Set[int]] = {}
+        self._object_cells: Dict[int, List[Tuple[int, int, int]]] = {}
+        self._oversized: Set[int] = set()
+
+        # Occupied cells as an array, built again on the first query after
+        # cells are created or emptied
+        self._keys: Optional[List[Tuple[int, int, int]]] = None
+        self._corners: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._object_cells) + len(self._oversized)
+
+    def update(self, index: int, bounds: np.ndarray):
+        '''Put, or move, an object in the grid given its (2, 3) bounds'''
+        self.remove(index)
+
+        low = np.floor(bounds[0] / self.cell_size).astype(int)
+        high = np.floor(bounds[1] / self.cell_size).astype(int)
+
+        if np.prod(high - low + 1) > self.max_cells_per_object:
+            self._oversized.add(index)
+            return
+
+        keys = list(product(*[range(start, end + 1)
+                              for start, end in zip(low.tolist(),
+                                                    high.tolist())]))
+        for key in keys:
+            if key not in self._cells:
+                self._cells[key] = set()
+                self._keys = None
+            self._cells[key].add(index)
+
+        self._object_cells[index] = keys
+
+    def remove(self, index: int):
+        '''Take an object out of the grid, if present'''
+        self._oversized.discard(index)
+
+        for key in self._object_cells.pop(index, []):
+            cell = self._cells[key]
+            cell.discard(index)
+            if not cell:
+                del self._cells[key]
+                self._keys = None
+
+    def query(self, view_matrix: np.ndarray, clipper: Clipper) -> np.ndarray:
+        '''Return, sorted, the indices of objects in cells that may be seen
+        through the clipper window once transformed by view_matrix'''
+        candidates = set(self._oversized)
+
+        if self._cells:
+            keys, corners = self._cell_corners()
+            projected = corners @ view_matrix
+
+            # A cell crossing the projection center can not be bounded by
+            # its corners, so it is always a candidate
+            behind = (projected[:, :, 3] <= 1e-9).any(axis=1)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                projected = projected[:, :, :3] / projected[:, :, 3:]
+
+            _, outside = clipper.classify_bounds(np.stack(
+                [projected.min(axis=1), projected.max(axis=1)], axis=1))
+
+            for key in compress(keys, (behind | ~outside).tolist()):
+                candidates |= self._cells[key]
+
+        return np.array(sorted(candidates), dtype=int)
+
+    def _cell_corners(self) -> Tuple[List[Tuple[int, int, int]], np.ndarray]:
+        '''Return occupied cell keys and their (C, 8, 4) homogeneous corners
+        '''
+        if self._keys is None:
+            self._keys = list(self._cells)
+            self._corners = np.ones((len(self._keys), 8, 4))
+            self._corners[:, :, :3] = (
+                np.array(self._keys, dtype=float)[:, None, :] + _CUBE_CORNERS
+            ) * self.cell_size
+
+        return self._keys, self._corners
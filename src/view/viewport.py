@@ -1,11 +1,174 @@
 '''Viewport object, used to draw objects into user interface'''
-from typing import List
+from functools import lru_cache
+from math import ceil, floor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 
-from PyQt5 import QtWidgets, QtGui
+import numpy as np
+from PyQt5 import QtWidgets, QtGui, sip
 #from PyQt5.QtWidgets import (QColorDialog)
+from PyQt5.QtCore import QLineF, QPoint, QPointF, QRect
 from PyQt5.QtGui import QColor
 
-from src.model.objects import ViewportObjectRepresentation
+from src.model.objects import Vertex, ViewportObjectRepresentation
+
+
+class PaintBatch(NamedTuple):
+    '''Geometry sharing one pen, submitted to the painter in two calls'''
+    color: QColor
+    thickness: int
+    # Drawing order of the first line or point, pens are painted by it
+    first: float
+    # Point pairs, one pair per line, or the lines themselves when the
+    # painter does not take arrays
+    lines: Union['sip.array', List[QLineF]]
+    points: Union['sip.array', QtGui.QPolygonF]
+
+
+@lru_cache(maxsize=None)
+def painter_takes_arrays() -> bool:
+    '''Tell if QPainter draws sip arrays of QPointF, as from PyQt5 5.15.
+    Older versions get lists of lines and polygons of points instead'''
+    if not hasattr(sip, 'array'):
+        return False
+
+    image = QtGui.QImage(1, 1, QtGui.QImage.Format_ARGB32_Premultiplied)
+    painter = QtGui.QPainter()
+    painter.begin(image)
+    try:
+        painter.drawPoints(sip.array(QPointF, 1))
+        return True
+    except TypeError:
+        return False
+    finally:
+        painter.end()
+
+
+def point_array(coordinates: np.ndarray) -> 'sip.array':
+    '''Copy (N, 2) coordinates into an array of QPointF, in a single pass
+    over its buffer'''
+    points = sip.array(QPointF, len(coordinates))
+    if len(coordinates):
+        np.frombuffer(memoryview(points), dtype=np.float64)[:] = \
+            coordinates.reshape(-1)
+
+    return points
+
+
+def map_coordinates(coordinates: np.ndarray, matrix: np.ndarray
+                    ) -> np.ndarray:
+    '''Map (N, 2) coordinates by a 3x3 matrix taking (x, y, 1) rows'''
+    return coordinates @ matrix[:2, :2] + matrix[2, :2]
+
+
+def moved_representation(obj: ViewportObjectRepresentation,
+                         matrix: np.ndarray) -> ViewportObjectRepresentation:
+    '''Return a copy of a representation with its x and y mapped by a 3x3
+    matrix, its depth left as it is'''
+    if obj.segments is not None:
+        return obj._replace(segments=map_coordinates(
+            obj.segments.reshape(-1, 2), matrix).reshape(-1, 4))
+
+    mapped = map_coordinates(
+        np.array([(p.x, p.y) for p in obj.points], dtype=float).reshape(-1, 2),
+        matrix).tolist()
+
+    return obj._replace(points=[Vertex(x=x, y=y, z=p.z)
+                                for (x, y), p in zip(mapped, obj.points)])
+
+
+class PackedRows(NamedTuple):
+    '''Lines or points of drawn objects, one per row, with the pen and the
+    drawing order of the object each one came from'''
+    # (R, 4) x1, y1, x2, y2 lines or (R, 2) points
+    coordinates: np.ndarray
+    order: np.ndarray
+    style: np.ndarray
+    owner: np.ndarray
+
+
+def pack_objects(objects: List[ViewportObjectRepresentation],
+                 order: np.ndarray, style: np.ndarray, owner: np.ndarray
+                 ) -> Tuple[PackedRows, PackedRows]:
+    '''Return the lines and the points of objects, all at once. Each row
+    takes the (N,) order, style and owner of its object. Wireframes become
+    their closed sides'''
+    # Objects made of points, as a single array
+    lengths = np.array([0 if obj.segments is not None else len(obj.points)
+                        for obj in objects], dtype=int)
+    coordinates = np.array([(p.x, p.y) for obj in objects
+                            if obj.segments is None for p in obj.points],
+                           dtype=float).reshape(-1, 2)
+    offsets = np.cumsum(lengths) - lengths
+
+    # Each corner goes to the next of its object, the last to the first.
+    # Lines have a single side, and points none
+    corner_length = np.repeat(lengths, lengths)
+    following = np.arange(1, len(coordinates) + 1)
+    following[(offsets + lengths - 1)[lengths > 0]] = offsets[lengths > 0]
+    is_side = (corner_length >= 3) | (
+        (corner_length == 2) & (following > np.arange(len(coordinates))))
+    is_point = corner_length == 1
+
+    corner_object = np.repeat(np.arange(len(objects)), lengths)
+    is_line_set = np.array([obj.segments is not None for obj in objects],
+                           dtype=bool)
+    line_sets = [obj.segments.reshape(-1, 4)
+                 for obj in objects if obj.segments is not None]
+    line_set_object = np.repeat(
+        np.flatnonzero(is_line_set),
+        [len(segments) for segments in line_sets]).astype(int)
+
+    lines = np.concatenate(
+        [np.concatenate([coordinates[is_side],
+                         coordinates[following[is_side]]], axis=1)]
+        + line_sets).reshape(-1, 4)
+    line_object = np.concatenate(
+        [corner_object[is_side], line_set_object]).astype(int)
+    point_object = corner_object[is_point]
+
+    return (PackedRows(lines, order[line_object], style[line_object],
+                       owner[line_object]),
+            PackedRows(coordinates[is_point], order[point_object],
+                       style[point_object], owner[point_object]))
+
+
+def merge_rows(rows: PackedRows, kept: np.ndarray, new_rows: PackedRows
+               ) -> PackedRows:
+    '''Return the rows set in the kept mask followed by new rows'''
+    return PackedRows(*[np.concatenate([column[kept], new_column])
+                        for column, new_column in zip(rows, new_rows)])
+
+
+def batch_rows(lines: PackedRows, points: PackedRows,
+               styles: List[Tuple[QColor, int]], selected: Iterable[int]
+               ) -> Dict[int, PaintBatch]:
+    '''Group the lines and points of the selected styles, by style, each
+    group in drawing order. Styles without rows are left out'''
+    batches = {}
+    for style in selected:
+        line_order, point_order = [rows.order[rows.style == style]
+                                   for rows in (lines, points)]
+        if not len(line_order) and not len(point_order):
+            continue
+
+        style_lines = lines.coordinates[lines.style == style][
+            np.argsort(line_order, kind='stable')]
+        style_points = points.coordinates[points.style == style][
+            np.argsort(point_order, kind='stable')]
+
+        color, thickness = styles[style]
+        batches[style] = PaintBatch(
+            color=color,
+            thickness=thickness,
+            first=np.concatenate([line_order, point_order]).min(),
+            lines=(point_array(style_lines.reshape(-1, 2))
+                   if painter_takes_arrays()
+                   else [QLineF(*line) for line in style_lines.tolist()]),
+            points=(point_array(style_points) if painter_takes_arrays()
+                    else QtGui.QPolygonF([QPointF(x, y) for x, y
+                                          in style_points.tolist()])))
+
+    return batches
 
 
 class ViewPort(QtWidgets.QLabel):
@@ -25,10 +188,50 @@ class ViewPort(QtWidgets.QLabel):
         '''
         self.setStyleSheet(stylesheet)
 
-        # Varaible to hold objects to be drawn
-        self.objects: List[ViewportObjectRepresentation] = []
+        # Varaible to hold objects to be drawn, by the name of their owner.
+        # Pieces are kept as given, with the total move applied to the drawn
+        # objects when they were given, and only mapped when asked for
+        self._pieces: Dict[
+            str, Tuple[np.ndarray, List[ViewportObjectRepresentation]]] = {}
+        self._moved = np.identity(3)
 
-    def draw_objects(self, objects: List[ViewportObjectRepresentation]):
+        # Same objects as lines and points rows, and those rows grouped by
+        # pen. Rows keep their owner object, by name, so a few objects can
+        # be swapped without packing everything again
+        self._styles: List[Tuple[QColor, int]] = []
+        self._style_ids: Dict[Tuple[int, int], int] = {}
+        self._owner_ids: Dict[str, int] = {}
+        self._owner_order: Dict[str, float] = {}
+        self._next_order = 0
+        self._lines = PackedRows(np.empty((0, 4)), np.empty(0),
+                                 np.empty(0, dtype=int), np.empty(0, dtype=int))
+        self._points = PackedRows(np.empty((0, 2)), np.empty(0),
+                                  np.empty(0, dtype=int),
+                                  np.empty(0, dtype=int))
+        self._batches: Dict[int, PaintBatch] = {}
+
+        # Objects are drawn into a back buffer, only rebuilt when they
+        # change, and paint events just copy it to the screen
+        self._buffer: Optional[QtGui.QImage] = None
+        self._buffer_stale = True
+        self._dirty_region = QtGui.QRegion()
+
+    @property
+    def objects(self) -> List[ViewportObjectRepresentation]:
+        '''Objects being drawn, in drawing order'''
+        objects = []
+        for name in sorted(self._pieces, key=self._owner_order.__getitem__):
+            moved, pieces = self._pieces[name]
+            if moved is not self._moved:
+                matrix = np.linalg.inv(moved) @ self._moved
+                pieces = [moved_representation(obj, matrix) for obj in pieces]
+
+            objects.extend(pieces)
+
+        return objects
+
+    def draw_objects(self, objects: List[ViewportObjectRepresentation],
+                     places: Optional[Dict[str, float]] = None):
         """
         Redraw view, checking if objects are inside the viewport
 
@@ -36,46 +239,208 @@ class ViewPort(QtWidgets.QLabel):
         ----------
         objects: List[ViewportObjectRepresentation]
             List of objects to be draw
+        places: Optional[Dict[str, float]]
+            Drawing place of each object, by the name shared by its pieces.
+            Objects are drawn in the given order if not set
         """
 
-        self.objects = objects
+        self._pieces = {}
+        self._moved = np.identity(3)
+        self._styles = []
+        self._style_ids = {}
+        self._owner_ids = {}
+        self._owner_order = {}
+        self._next_order = 0
+
+        pieces_by_name = {}
+        for position, obj in enumerate(objects):
+            pieces_by_name.setdefault(obj.name, []).append(obj)
+            if places is None:
+                self._owner_order.setdefault(obj.name, position)
+
+        objects, order = self._place_pieces(pieces_by_name, places)
+        self._lines, self._points = self._pack(objects, order)
+        self._batches = batch_rows(self._lines, self._points, self._styles,
+                                   range(len(self._styles)))
+
+        self._buffer_stale = True
         self.update()
 
-    def paintEvent(self, _event: QtGui.QPaintEvent):
-        '''Reimplementing paint event function, that is called by update'''
+    def replace_objects(
+            self, pieces_by_name: Dict[str, List[ViewportObjectRepresentation]],
+            places: Optional[Dict[str, float]] = None):
+        """
+        Swap the drawn pieces of some objects by new ones, repainting only
+        the rectangle covered by the old and the new pieces
+
+        Parameters
+        ----------
+        pieces_by_name: Dict[str, List[ViewportObjectRepresentation]]
+            New pieces of each object, by the name shared by its pieces.
+            They are drawn where the old ones were
+        places: Optional[Dict[str, float]]
+            Drawing place of objects not drawn yet, by name. They are drawn
+            last if not set
+        """
+        objects, order = self._place_pieces(pieces_by_name, places)
+        new_lines, new_points = self._pack(objects, order)
+
+        replaced = np.array([self._owner_ids.get(name, -1)
+                             for name in pieces_by_name], dtype=int)
+        old_lines = np.isin(self._lines.owner, replaced)
+        old_points = np.isin(self._points.owner, replaced)
+
+        for lines, points in ((self._lines.coordinates[old_lines],
+                               self._points.coordinates[old_points]),
+                              (new_lines.coordinates, new_points.coordinates)):
+            rect = self._rows_rect(lines, points)
+            if rect is not None:
+                self._dirty_region += rect
+                self.update(rect)
+
+        # Only the pens of the old and new pieces are grouped again
+        touched = set(np.concatenate([
+            self._lines.style[old_lines], self._points.style[old_points],
+            new_lines.style, new_points.style]).astype(int).tolist())
+
+        self._lines = merge_rows(self._lines, ~old_lines, new_lines)
+        self._points = merge_rows(self._points, ~old_points, new_points)
+
+        for style in touched:
+            self._batches.pop(style, None)
+        self._batches.update(batch_rows(self._lines, self._points,
+                                        self._styles, touched))
+
+    def _place_pieces(
+            self, pieces_by_name: Dict[str, List[ViewportObjectRepresentation]],
+            places: Optional[Dict[str, float]]
+    ) -> Tuple[List[ViewportObjectRepresentation], np.ndarray]:
+        '''Keep the pieces of each object, placing the objects not drawn
+        yet. Return the pieces and their drawing order, the pieces of an
+        object sharing its place'''
+        objects = []
+        starts = []
+        counts = []
+        for name, pieces in pieces_by_name.items():
+            if name not in self._owner_order:
+                self._owner_order[name] = (
+                    self._next_order if places is None else places[name])
+                self._next_order = max(self._next_order,
+                                       floor(self._owner_order[name]) + 1)
+
+            objects.extend(pieces)
+            starts.append(self._owner_order[name])
+            counts.append(len(pieces))
+            self._pieces[name] = (self._moved, pieces)
+
+        # Pieces of an object are spread over [place, place + 1)
+        counts = np.array(counts, dtype=int)
+        rank = (np.arange(counts.sum())
+                - np.repeat(np.cumsum(counts) - counts, counts))
+        order = (np.repeat(np.array(starts, dtype=float), counts)
+                 + rank / np.repeat(np.maximum(counts, 1), counts))
+
+        return objects, order
+
+    def move_objects(self, matrix: np.ndarray):
+        """
+        Map every drawn object by the same affine change, as a pan or a
+        zoom of the window does, without packing them again
+
+        Parameters
+        ----------
+        matrix: np.ndarray
+            3x3 matrix taking viewport (x, y, 1) rows to their new place
+        """
+        self._moved = self._moved @ matrix
+        self._lines = self._lines._replace(coordinates=map_coordinates(
+            self._lines.coordinates.reshape(-1, 2), matrix).reshape(-1, 4))
+        self._points = self._points._replace(coordinates=map_coordinates(
+            self._points.coordinates, matrix))
+
+        if not painter_takes_arrays():
+            self._batches = batch_rows(self._lines, self._points,
+                                       self._styles, self._batches)
+            self._buffer_stale = True
+            self.update()
+            return
+
+        # Batches keep their drawing order, so their points are mapped in
+        # place
+        for batch in self._batches.values():
+            for points in (batch.lines, batch.points):
+                if len(points):
+                    coordinates = np.frombuffer(
+                        memoryview(points), dtype=np.float64).reshape(-1, 2)
+                    coordinates[:] = map_coordinates(coordinates, matrix)
+
+        self._buffer_stale = True
+        self.update()
+
+    def _pack(self, objects: List[ViewportObjectRepresentation],
+              order: np.ndarray) -> Tuple[PackedRows, PackedRows]:
+        '''Pack objects in rows, with the given (N,) drawing order'''
+        style = []
+        owner = []
+        for obj in objects:
+            key = (obj.color.rgba(), obj.thickness)
+            if key not in self._style_ids:
+                self._style_ids[key] = len(self._styles)
+                self._styles.append((obj.color, obj.thickness))
+
+            style.append(self._style_ids[key])
+            owner.append(self._owner_ids.setdefault(obj.name,
+                                                    len(self._owner_ids)))
+
+        return pack_objects(objects, order, np.array(style, dtype=int),
+                            np.array(owner, dtype=int))
+
+    def _rows_rect(self, lines: np.ndarray, points: np.ndarray
+                   ) -> Optional[QRect]:
+        '''Rectangle covering the given (L, 4) lines and (P, 2) points, with
+        room for the widest pen'''
+        coordinates = np.concatenate([lines.reshape(-1, 2), points])
+        if not len(coordinates):
+            return None
+
+        margin = max(thickness for _, thickness in self._styles) + 1
+        (xmin, ymin), (xmax, ymax) = (coordinates.min(axis=0),
+                                      coordinates.max(axis=0))
+
+        return QRect(QPoint(floor(xmin) - margin, floor(ymin) - margin),
+                     QPoint(ceil(xmax) + margin, ceil(ymax) + margin))
+
+    def _render(self, rect: Optional[QRect] = None):
+        '''Draw the objects into the back buffer, only inside rect if given'''
+        if self._buffer is None or self._buffer.size() != self.size():
+            self._buffer = QtGui.QImage(
+                self.size(), QtGui.QImage.Format_ARGB32_Premultiplied)
+            rect = None
 
         painter = QtGui.QPainter()
-        painter.begin(self)
+        painter.begin(self._buffer)
+        if rect is None:
+            rect = self._buffer.rect()
+        painter.setClipRect(rect)
+
+        # Clear to transparent, the background comes from the style sheet
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_Clear)
+        painter.fillRect(rect, QColor(0, 0, 0, 0))
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_SourceOver)
+
         pen = QtGui.QPen()
-        for obj in self.objects:
-            # Get specific attributes
-            pen.setWidth(obj.thickness)
-            pen.setColor(obj.color)
+        for batch in sorted(self._batches.values(),
+                            key=lambda batch: batch.first):
+            # Each pen is set once, and its geometry sent in two calls
+            pen.setWidth(batch.thickness)
+            pen.setColor(batch.color)
             painter.setPen(pen)
 
-            # In case it is a point
-            if len(obj.points) == 1:
-                point = obj.points[0]
-                painter.drawPoint(point.x, point.y)
-
-            # In case it is a line
-            elif len(obj.points) == 2:
-                init_p, end_p = obj.points
-                painter.drawLine(init_p.x, init_p.y,
-                                 end_p.x, end_p.y)
-
-            # In case it is a wireframe
-            else:
-                init_p = obj.points[0]
-                prev_p = init_p
-                for current_p in obj.points[1:]:
-                    painter.drawLine(prev_p.x, prev_p.y,
-                                     current_p.x, current_p.y)
-                    prev_p = current_p
-
-                last_p = obj.points[-1]
-                painter.drawLine(last_p.x, last_p.y,
-                                 init_p.x, init_p.y)
+            if len(batch.lines):
+                painter.drawLines(batch.lines)
+
+            if len(batch.points):
+                painter.drawPoints(batch.points)
 
         # drawing the view port border
         pen.setWidth(2)
@@ -88,3 +453,21 @@ class ViewPort(QtWidgets.QLabel):
         painter.drawLine(590, 10, 590, 590)
 
         painter.end()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        '''Reimplementing paint event function, that is called by update.
+        The back buffer is brought up to date, then copied where needed'''
+        if (self._buffer_stale or self._buffer is None
+                or self._buffer.size() != self.size()):
+            self._render()
+            self._buffer_stale = False
+            self._dirty_region = QtGui.QRegion()
+
+        elif not self._dirty_region.isEmpty():
+            self._render(self._dirty_region.boundingRect())
+            self._dirty_region = QtGui.QRegion()
+
+        painter = QtGui.QPainter()
+        painter.begin(self)
+        painter.drawImage(event.rect(), self._buffer, event.rect())
+        painter.end()